@@ -0,0 +1,128 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from Instrumentation import *
+from Synthetic import *
+
+
+class Benchmark:
+    '''
+    Timing the pipeline on synthetic data (see Synthetic) of growing size:-
+    python Benchmark.py --sizes 10000 100000 1000000 10000000
+    Every size runs in a fresh process, so the peak RSS reported is the one of that size. The
+    stages are timed with Instrumentation, their sub-steps are kept in the --metrics file.
+    The generated csv files are kept in the data directory and reused by the next run.
+    '''
+    sizes = [10 ** 4, 10 ** 5, 10 ** 6]
+    stages = ['preProcessing', 'calculatePointFeatures', 'calculateSubTrajectories', 'fitHierarchy',
+              'predictHierarchy']
+
+    # The csv of the given size, generated on the first use
+    def dataFile(directory, points, seed=0, allModes=False):
+        fileName = os.path.join(directory, 'synthetic-{}-{}-{}.csv'.format(points, seed,
+                                                                          'all' if allModes else 'classified'))
+        if not os.path.exists(fileName):
+            Synthetic.generate(fileName + '.tmp', points, seed=seed, allModes=allModes)
+            os.rename(fileName + '.tmp', fileName)
+        return fileName
+
+    def runStages(fileName, points, classifier='rf', precision='float64', chunkSize=None, workers=1,
+                  traceMemory=False):
+        '''
+        Running the stages once on fileName in this process.
+        Param :- fileName, points, classifier ('rf' or 'dt'), precision, chunkSize, workers, traceMemory
+        Return :- list of the Instrumentation records of the stages and their sub-steps
+        '''
+        from Utils import Utils
+        from Preprocessing import Preprocessing
+        from FeatureRegistry import FeatureRegistry
+        from Featurization import Featurization
+        from Classifiers import Classifiers
+        from Evaluation import Evaluation
+        from Cli import Cli
+        records = []
+        Instrumentation.enable(records.append, traceMemory)
+        features = FeatureRegistry.defaults
+        with Instrumentation.stage('preProcessing', points) as span:
+            if chunkSize:
+                from Ingestion import Ingestion
+                table = Ingestion.preProcess(fileName, chunkSize)
+            else:
+                table = Preprocessing.preProcess(fileName)
+            span['rowsOut'] = Instrumentation.rows(table)
+        with Instrumentation.stage('calculatePointFeatures', points) as span:
+            if workers != 1:
+                from Parallel import Parallel
+                table, segments = Parallel.pointFeatures(table, features, precision, 'wrap', Utils.excludedModes,
+                                                         Featurization.minPoints, workers)
+            else:
+                table, segments = Featurization.pointFeatures(table, features, precision, 'wrap',
+                                                              Utils.excludedModes, Featurization.minPoints)
+            span['rowsOut'] = Instrumentation.rows(table)
+        with Instrumentation.stage('calculateSubTrajectories', points) as span:
+            if workers != 1:
+                rows = Parallel.subTrajectories(table, segments, features, workers=workers)
+            else:
+                rows = Featurization.subTrajectories(table, segments, features)
+            span['rowsOut'] = len(rows)
+        frame = Utils.subTrajectoryFrame(rows, precision, Utils.columns)
+        frame = frame[frame['transportation_mode'].isin(Cli.classes)]
+        data, labels = Cli.hierarchyData(frame), frame['transportation_mode'].astype(str)
+        with Instrumentation.stage('fitHierarchy', points) as span:
+            fit = Classifiers.fitHierarchyRFC if classifier == 'rf' else Classifiers.fitHierarchyDTC
+            modelDic = fit(data, labels, {}, workers=workers)
+            span['rowsOut'] = len(data)
+        with Instrumentation.stage('predictHierarchy', points) as span:
+            span['rowsOut'] = len(Evaluation.predictHierarchy(data, modelDic))
+        Instrumentation.disable()
+        return records
+
+    def run(sizes, directory, seed=0, **options):
+        '''
+        Param :- sizes (points), directory of the csv files, seed, options of runStages
+        Return :- generator of (points, records) for every size
+        '''
+        for points in sizes:
+            fileName = Benchmark.dataFile(directory, points, seed)
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                yield points, pool.submit(Benchmark.runStages, fileName, points, **options).result()
+
+    def report(points, records):
+        for record in records:
+            if record['stage'] in Benchmark.stages:
+                memoryPeak = record.get('memoryPeak')
+                print('{:>12,} {:<26} {:>9.3f} s {:>14,.0f} points/s {:>9,} rows {:>8.1f} MB RSS {}'.format(
+                    points, record['stage'], record['wall'], points / max(record['wall'], 1e-9),
+                    record['rowsOut'], record['maxRss'] / 2 ** 20,
+                    '' if memoryPeak is None else '{:>8.1f} MB traced'.format(memoryPeak / 2 ** 20)))
+
+    def main(argv=None):
+        parser = argparse.ArgumentParser(prog='Benchmark.py', description='Scaling benchmark on synthetic GPS data')
+        parser.add_argument('--sizes', type=int, nargs='+', default=Benchmark.sizes, help='points per run')
+        parser.add_argument('--data-dir', default=tempfile.gettempdir(), help='where the csv files are kept')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--classifier', default='rf', choices=['rf', 'dt'])
+        parser.add_argument('--precision', default='float64', choices=['float32', 'float64'])
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='record the peak of the Python allocations, makes the stages slower')
+        parser.add_argument('--metrics', default=None, help='append every record as a JSON line to this file')
+        args = parser.parse_args(argv)
+        sink = JsonLinesSink(args.metrics) if args.metrics else None
+        for points, records in Benchmark.run(args.sizes, args.data_dir, args.seed, classifier=args.classifier,
+                                             precision=args.precision, chunkSize=args.chunk_size,
+                                             workers=args.workers, traceMemory=args.trace_memory):
+            Benchmark.report(points, records)
+            if sink:
+                for record in records:
+                    sink(dict(record, points=points))
+        if sink:
+            sink.close()
+
+
+if __name__ == '__main__':
+    Benchmark.main(sys.argv[1:])
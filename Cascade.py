@@ -0,0 +1,176 @@
+import importlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from Instrumentation import *
+
+
+class Cascade:
+    '''
+    Classifier hierarchies described by configuration. A node is a dict with
+    'name' :- key of its fitted estimator in the modelDic
+    'estimator' :- (optional) 'rf', 'dt' or the dotted path of any scikit-learn style
+                   classifier, the estimator passed to fit by default. Only trees and forests
+                   can be saved with CompiledModels (see CompiledModels.compilable).
+    'params' :- (optional) keyword arguments of the estimator
+    'branches' :- list of dicts with
+        'label' :- the label the node predicts for this branch
+        'classes' :- (optional) true classes that belong to the branch, a branch without
+                     classes gets every class that no other branch of the node lists
+        'then' :- the predicted class (a string) or the next node
+    A node is trained on the rows whose true class reaches it, each labelled with the label of
+    its branch. When every branch of a node lists its classes, rows of the other classes are left
+    out of its training set. All the training sets are index masks over one feature array, computed from the
+    true labels before anything is fitted. Prediction sends every row down the branch of the
+    label predicted for it until it ends in a class.
+    '''
+    estimators = {'rf': 'sklearn.ensemble.RandomForestClassifier',
+                  'dt': 'sklearn.tree.DecisionTreeClassifier'}
+
+    # The hierarchy of the paper: train, subway, walk, car and taxi are split off one after the
+    # other and what is left is bus. The labels are the ones of Utils.relabel.
+    hierarchy = {'name': 'C1', 'branches': [
+        {'label': 100, 'classes': ['train'], 'then': 'train'},
+        {'label': -100, 'then': {'name': 'C2', 'branches': [
+            {'label': -80, 'classes': ['subway'], 'then': 'subway'},
+            {'label': 80, 'then': {'name': 'C3', 'branches': [
+                {'label': -60, 'classes': ['walk'], 'then': 'walk'},
+                {'label': 60, 'then': {'name': 'C4', 'branches': [
+                    {'label': -40, 'classes': ['car'], 'then': 'car'},
+                    {'label': 40, 'then': {'name': 'C5', 'branches': [
+                        {'label': -20, 'classes': ['taxi'], 'then': 'taxi'},
+                        {'label': 20, 'then': 'bus'}]}}]}}]}}]}}]}
+
+    def load(fileName):
+        with open(fileName) as f:
+            return Cascade.validate(json.load(f))
+
+    # Checking a configuration, every node needs a unique name, distinct labels and at most one
+    # branch without classes, and no class may be listed by two branches of the same node
+    def validate(cascade):
+        names = set()
+        for node in Cascade.nodes(cascade):
+            if 'name' not in node or node['name'] in names:
+                raise ValueError('Every node of the cascade needs a unique name, not {!r}'.format(node.get('name')))
+            names.add(node['name'])
+            branches = node.get('branches', [])
+            if len(branches) < 2:
+                raise ValueError('Node {} needs at least two branches'.format(node['name']))
+            labels = [branch['label'] for branch in branches]
+            listed = [cls for branch in branches for cls in branch.get('classes', [])]
+            if len(set(labels)) != len(labels) or len(set(listed)) != len(listed):
+                raise ValueError('Labels and classes of the branches of node {} have to be distinct'.format(
+                    node['name']))
+            if sum('classes' not in branch for branch in branches) > 1:
+                raise ValueError('Node {} has more than one branch without classes'.format(node['name']))
+        return cascade
+
+    # The nodes of the cascade, every node before its children
+    def nodes(cascade):
+        nodes = [cascade]
+        for node in nodes:
+            nodes.extend(branch['then'] for branch in node['branches'] if isinstance(branch['then'], dict))
+        return nodes
+
+    def estimator(node, default='rf'):
+        name = node.get('estimator', default)
+        moduleName, _, className = Cascade.estimators.get(name, name).rpartition('.')
+        return getattr(importlib.import_module(moduleName), className)(**node.get('params', {}))
+
+    def trainingSets(cascade, labels):
+        '''
+        The training set of every node, from the true labels only.
+        Param :- cascade, labels (true class of every row)
+        Return :- list of (node, indices of its rows, labels of its branches for those rows), a node
+        only when rows reach it
+        '''
+        labels = np.asarray(labels).astype(str)
+        sets = []
+        reaching = [(cascade, np.ones(len(labels), dtype=bool))]
+        for node, mask in reaching:
+            if not mask.any():
+                continue
+            target = np.empty(len(labels), dtype=object)
+            routed = np.zeros(len(labels), dtype=bool)
+            listed = [cls for branch in node['branches'] for cls in branch.get('classes', [])]
+            for branch in node['branches']:
+                member = mask & (np.isin(labels, branch['classes']) if 'classes' in branch
+                                 else ~np.isin(labels, listed))
+                target[member] = branch['label']
+                routed |= member
+                if isinstance(branch['then'], dict):
+                    reaching.append((branch['then'], member))
+            index = np.flatnonzero(routed)
+            if not len(index):
+                continue
+            sets.append((node, index, np.array(target[index].tolist())))
+        return sets
+
+    # Threads fitting nodes at the same time, and n_jobs of every node in proportion to the rows
+    # it is trained on, so that together they use about the given number of cores and no more.
+    # Estimators whose params set n_jobs keep it.
+    def threadPlan(sets, workers):
+        cores = workers or os.cpu_count() or 1
+        rows = sum(len(index) for _, index, _ in sets)
+        return min(cores, len(sets)), [max(1, cores * len(index) // rows) for _, index, _ in sets]
+
+    def fitNode(node, estimator, X, index, target, jobs, parent=None):
+        model = Cascade.estimator(node, estimator)
+        if jobs is not None and 'n_jobs' in model.get_params() and 'n_jobs' not in node.get('params', {}):
+            model.set_params(n_jobs=jobs)
+        with Instrumentation.stage(node['name'], len(index), parent):
+            return model.fit(X[index], target)
+
+    def fit(trainData, trainLabels, cascade=None, estimator='rf', modelDic=None, workers=1):
+        '''
+        Fitting every node of the cascade. The training set of every node only depends on the
+        true labels, so with more than one worker all the nodes are fitted at the same time on a
+        thread pool, the largest first, and the cores left over go to n_jobs of the estimators.
+        Trees and forests of scikit-learn release the GIL while they are built, and the threads
+        share the feature array instead of copying it to other processes. The models are the
+        same as with one worker when every estimator has a random_state.
+        Param :- trainData, trainLabels, cascade (Cascade.hierarchy by default), estimator of the
+        nodes that do not name their own, modelDic the estimators are added to, workers (None
+        for all cores)
+        Return :- modelDic, node name -> fitted estimator
+        '''
+        modelDic = {} if modelDic is None else modelDic
+        X = np.asarray(trainData)
+        sets = Cascade.trainingSets(cascade or Cascade.hierarchy, trainLabels)
+        if workers == 1 or len(sets) < 2:
+            for node, index, target in sets:
+                modelDic[node['name']] = Cascade.fitNode(node, estimator, X, index, target, None)
+            return modelDic
+        threads, jobs = Cascade.threadPlan(sets, workers)
+        parent = Instrumentation.path()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = {}
+            for position in sorted(range(len(sets)), key=lambda position: -len(sets[position][1])):
+                node, index, target = sets[position]
+                futures[node['name']] = pool.submit(Cascade.fitNode, node, estimator, X, index, target,
+                                                    jobs[position], parent)
+            for node, _, _ in sets:
+                modelDic[node['name']] = futures[node['name']].result()
+        return modelDic
+
+    def predict(testData, modelDic, cascade=None):
+        '''
+        Param :- testData, modelDic of fit (or CompiledModels.load), cascade it was fitted with
+        Return :- list with the predicted class of every row
+        '''
+        X = np.asarray(testData)
+        predicted = np.empty(len(X), dtype=object)
+        pending = [(cascade or Cascade.hierarchy, np.arange(len(X)))]
+        while pending:
+            node, index = pending.pop()
+            if not len(index):
+                continue
+            labels = np.asarray(modelDic[node['name']].predict(X[index]))
+            for branch in node['branches']:
+                rows = index[labels == branch['label']]
+                if isinstance(branch['then'], dict):
+                    pending.append((branch['then'], rows))
+                else:
+                    predicted[rows] = branch['then']
+        return predicted.tolist()
@@ -0,0 +1,112 @@
+import hashlib
+import io
+import json
+import sys
+import numpy as np
+from PointCache import *
+from Instrumentation import *
+
+
+class TeeOutput(io.StringIO):
+    '''
+    Captures what a stage prints while still passing it on to the real stdout, so that the
+    report of a stage can be stored in its checkpoint and printed again when it is skipped.
+    '''
+
+    def __init__(self, stream):
+        io.StringIO.__init__(self)
+        self.stream = stream
+
+    def write(self, text):
+        self.stream.write(text)
+        return io.StringIO.write(self, text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class Checkpoints:
+    '''
+    Checkpoints of the stages of the pipeline. The output of every stage is stored as a
+    PointCache entry under a key that hashes the key of the stage before it with the name and
+    the parameters of the stage, and the key of the first stage hashes the content of the
+    input file. A stage whose key has an entry is skipped and its output loaded instead, so
+    changing a parameter reruns that stage and every stage after it, and a crashed run
+    resumes after the last stage that finished. With fromStage that stage and all the later
+    ones are run even when they have a checkpoint.
+    '''
+    # Bumped whenever the output of a stage changes for the same input and parameters
+    version = 1
+
+    def __init__(self, directory, fileName, stages, fromStage=None):
+        '''
+        Param :- directory (None for no checkpoints), fileName of the input, stages (list of
+        (stage name, parameters dict) in the order they run), fromStage
+        '''
+        names = [name for name, _ in stages]
+        if fromStage is not None and fromStage not in names:
+            raise ValueError('Unknown stage {}, the stages are {}'.format(fromStage, names))
+        self.directory = directory
+        self.names = names
+        self.fromStage = fromStage
+        self.keys = {}
+        if directory is None:
+            return
+        key = PointCache.fingerprint(fileName, {'checkpoints': Checkpoints.version})
+        for name, parameters in stages:
+            key = hashlib.sha1(json.dumps([key, name, parameters], sort_keys=True).encode('utf-8')).hexdigest()
+            self.keys[name] = key
+
+    # True when the stage has to run even if there is a checkpoint
+    def forced(self, stage):
+        return self.fromStage is not None and self.names.index(stage) >= self.names.index(self.fromStage)
+
+    def run(self, stage, compute, encode=None, decode=None):
+        '''
+        The output of a stage, from its checkpoint when it has one, otherwise computed and
+        checkpointed. encode turns the output into a dict of columns for PointCache and decode
+        turns it back, a stage whose output already is a dict of columns needs neither.
+        Param :- stage, compute (function without arguments), encode, decode
+        Return :- (output, True when it came from the checkpoint)
+        '''
+        with Instrumentation.stage(stage) as span:
+            output, span['checkpoint'] = self.runStage(stage, compute, encode, decode)
+            span['rowsOut'] = Instrumentation.rows(output)
+        return output, span['checkpoint']
+
+    def runStage(self, stage, compute, encode, decode):
+        if self.directory is None:
+            return compute(), False
+        if not self.forced(stage):
+            table = PointCache.load(self.directory, self.keys[stage])
+            if table is not None:
+                return (decode(table) if decode else table), True
+        output = compute()
+        PointCache.save(self.directory, self.keys[stage], encode(output) if encode else output)
+        return output, False
+
+    # Running a stage that only prints, its checkpoint is what it printed
+    def runReport(self, stage, compute):
+        def capture():
+            stdout = sys.stdout
+            sys.stdout = TeeOutput(stdout)
+            try:
+                compute()
+                return sys.stdout.getvalue()
+            finally:
+                sys.stdout = stdout
+
+        report, loaded = self.run(stage, capture, lambda text: {'report': np.array([text])},
+                                  lambda table: str(table['report'][0]))
+        if loaded:
+            print(report, end='')
+        return loaded
+
+    # Sub trajectory rows as columns and back, the 4 key columns and the statistics matrix
+    def rowsTable(rows):
+        rows = np.asarray(rows, dtype=np.float64).reshape(len(rows), -1) if len(rows) else np.zeros((0, 4))
+        return {'keys': rows[:, :4].astype(np.int64), 'stats': rows[:, 4:]}
+
+    def tableRows(table):
+        return [keys + stats for keys, stats in zip(np.asarray(table['keys']).tolist(),
+                                                     np.asarray(table['stats']).tolist())]
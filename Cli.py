@@ -0,0 +1,275 @@
+import argparse
+import os
+import sys
+from Instrumentation import *
+
+
+class Cli:
+    '''
+    Command line interface of the pipeline, one subcommand per part of it:-
+    python Cli.py generate synthetic.csv --points 1000000   (see Synthetic)
+    python Cli.py ingest geolife_raw.csv points
+    python Cli.py featurize points features
+    python Cli.py train features model.npz
+    python Cli.py predict features model.npz predictions.csv
+    python Cli.py evaluate features --model model.npz   (or --cv for the cross validation of step 6)
+    Tables are directories of .npy columns (see PointCache). Every subcommand imports the
+    modules it needs when it runs, and the model is stored as plain arrays (see CompiledModels),
+    so predict loads neither scikit-learn, SciPy nor matplotlib.
+    '''
+    # Classes of the classifier hierarchy, the other modes are left out of training and evaluation
+    classes = ['train', 'subway', 'walk', 'car', 'taxi', 'bus']
+
+    # Classes a cascade predicts, Cli.classes for the default hierarchy
+    def cascadeClasses(cascade):
+        from Cascade import Cascade
+        if cascade is None:
+            return Cli.classes
+        return sorted(set(branch['then'] for node in Cascade.nodes(cascade) for branch in node['branches']
+                          if not isinstance(branch['then'], dict)))
+
+    def saveTable(path, table):
+        from PointCache import PointCache
+        path = os.path.abspath(path)
+        return PointCache.save(os.path.dirname(path), os.path.basename(path), table)
+
+    def loadTable(path):
+        from PointCache import PointCache
+        path = os.path.abspath(path)
+        table = PointCache.load(os.path.dirname(path), os.path.basename(path))
+        if table is None:
+            raise SystemExit('{} is not a table directory'.format(path))
+        return table
+
+    # Sub trajectory table as a DataFrame with the mode names, like TrajectoryAnalytics.dataSubTrajectories
+    def subTrajectoryFrame(table):
+        import numpy as np
+        import pandas as pd
+        from Utils import Utils
+        frame = pd.DataFrame({name: np.asarray(column) for name, column in table.items()})
+        frame['transportation_mode'] = pd.Categorical.from_codes(frame['transportation_mode'], Utils.modes)
+        return frame
+
+    # The 20 features of the hierarchy in the column order it was trained with
+    def hierarchyData(frame):
+        from Utils import Utils
+        return frame[Utils.columns[4:]]
+
+    def generate(args):
+        from Synthetic import Synthetic
+        points = Synthetic.generate(args.output, args.points, args.synthetic_users, args.seed, args.all_modes)
+        print('{} synthetic points written to {}'.format(points, args.output))
+
+    def readPoints(args):
+        from Preprocessing import Preprocessing
+        if args.chunk_size:
+            from ExternalSort import ExternalSort
+            from Ingestion import Ingestion
+            sortedName = ExternalSort.ensureSorted(args.input, args.chunk_size)
+            try:
+                return Ingestion.preProcess(sortedName, args.chunk_size, args.users)
+            finally:
+                if sortedName != args.input:
+                    os.remove(sortedName)
+        return Preprocessing.buildPairs(*Preprocessing.readPoints(args.input, args.users))
+
+    # The point table of a table directory or a csv to featurize, and the segments of the users
+    # --users leaves out before each selected user (see Ingestion.selectUsers), so that the flags
+    # are the ones of the whole file
+    def featurizeInput(args):
+        if os.path.isdir(args.input):
+            return Cli.loadTable(args.input), {}
+        if not args.users:
+            return Cli.readPoints(args), {}
+        from ExternalSort import ExternalSort
+        from Ingestion import Ingestion
+        sortedName = ExternalSort.ensureSorted(args.input, args.chunk_size or Ingestion.chunkSize)
+        try:
+            return Ingestion.selectUsers(sortedName, args.users, args.chunk_size, args.gap_policy)
+        finally:
+            if sortedName != args.input:
+                os.remove(sortedName)
+
+    def ingest(args):
+        table = Cli.readPoints(args)
+        Cli.saveTable(args.output, table)
+        print('{} pairs written to {}'.format(len(table['t_user_id']), args.output))
+
+    # Sub trajectory table of a table directory written by ingest, or of a csv file
+    def featurizeTable(args):
+        import numpy as np
+        from Utils import Utils
+        from FeatureRegistry import FeatureRegistry
+        from Featurization import Featurization
+        features = FeatureRegistry.withDefaults(args.features)
+        window = {'size': args.window_size, 'duration': args.window_duration, 'stride': args.window_stride} \
+            if (args.window_size or args.window_duration) else None
+        minPoints = None if window else Featurization.minPoints
+        if args.chunk_size and args.workers == 1 and not os.path.isdir(args.input):
+            # Streaming the csv user by user, only the sub trajectories are kept in memory
+            from ExternalSort import ExternalSort
+            from Ingestion import Ingestion
+            sortedName = ExternalSort.ensureSorted(args.input, args.chunk_size)
+            try:
+                rows = Featurization.toRows(*Ingestion.subTrajectoryArrays(
+                    sortedName, features, args.chunk_size, args.precision, args.gap_policy, args.users, window))
+            finally:
+                if sortedName != args.input:
+                    os.remove(sortedName)
+        elif args.workers != 1:
+            from Parallel import Parallel
+            from Ingestion import Ingestion
+            points, skipped = Cli.featurizeInput(args)
+            points, segments = Parallel.pointFeatures(points, features, args.precision, args.gap_policy,
+                                                      Utils.excludedModes, minPoints, args.workers)
+            points['flag'] = Ingestion.offsetFlags(points['flag'], points['t_user_id'], skipped)
+            rows = Parallel.subTrajectories(points, segments, features, window=window, workers=args.workers)
+        else:
+            from Ingestion import Ingestion
+            points, skipped = Cli.featurizeInput(args)
+            points, segments = Featurization.pointFeatures(points, features, args.precision, args.gap_policy,
+                                                           Utils.excludedModes, minPoints)
+            points['flag'] = Ingestion.offsetFlags(points['flag'], points['t_user_id'], skipped)
+            if window:
+                from Windows import Windows
+                rows = Windows.subTrajectories(points, segments, features, window['size'], window['duration'],
+                                               window['stride'])
+            else:
+                rows = Featurization.subTrajectories(points, segments, features)
+        frame = Utils.subTrajectoryFrame(rows, args.precision, FeatureRegistry.subTrajectoryColumns(features))
+        table = {name: frame[name].values for name in frame.columns}
+        table['transportation_mode'] = frame['transportation_mode'].cat.codes.values.astype(np.int8)
+        return table
+
+    def featurize(args):
+        table = Cli.featurizeTable(args)
+        Cli.saveTable(args.output, table)
+        print('{} sub trajectories written to {}'.format(len(table['flag']), args.output))
+
+    def train(args):
+        from Cascade import Cascade
+        from CompiledModels import CompiledModels
+        cascade = Cascade.load(args.cascade) if args.cascade else None
+        # The model is saved compiled, so every node has to be a tree or a forest of trees
+        CompiledModels.checkCascade(cascade, args.classifier)
+        frame = Cli.subTrajectoryFrame(Cli.loadTable(args.input))
+        frame = frame[frame['transportation_mode'].isin(Cli.cascadeClasses(cascade))]
+        labels = frame['transportation_mode'].astype(str)
+        modelDic = Cascade.fit(Cli.hierarchyData(frame), labels, cascade, args.classifier, workers=args.workers)
+        CompiledModels.save(modelDic, args.model, cascade)
+        print('Hierarchy of {} trained on {} sub trajectories, written to {}'.format(
+            args.classifier, len(frame), args.model))
+
+    # Predicted mode of every sub trajectory of the input, as a DataFrame with the key columns
+    def predictFrame(args):
+        from Evaluation import Evaluation
+        from CompiledModels import CompiledModels
+        table = Cli.loadTable(args.input) if os.path.isdir(args.input) else Cli.featurizeTable(args)
+        frame = Cli.subTrajectoryFrame(table).reset_index(drop=True)
+        modelDic = CompiledModels.load(args.model)
+        result = frame[['t_user_id', 'transportation_mode', 'date_Start', 'flag']].copy()
+        result['predicted'] = Evaluation.predictHierarchy(Cli.hierarchyData(frame), modelDic,
+                                                          CompiledModels.loadCascade(args.model))
+        return result
+
+    def predict(args):
+        result = Cli.predictFrame(args)
+        result.to_csv(args.output, index=False)
+        print('{} predictions written to {}'.format(len(result), args.output))
+
+    def evaluate(args):
+        if args.cv:
+            import pandas as pd
+            from TrajectoryAnalytics import TrajectoryAnalytics
+            frame = Cli.subTrajectoryFrame(Cli.loadTable(args.input))
+            frame = frame[frame['transportation_mode'].isin(Cli.classes)].reset_index(drop=True)
+            frame['transportation_mode'] = frame['transportation_mode'].astype(str)
+            # Step 6 only needs the sub trajectories, with the mode in front of the 20 features
+            holder = argparse.Namespace(dataSubTrajectories=pd.concat(
+                [frame[['transportation_mode']], Cli.hierarchyData(frame)], axis=1))
+            TrajectoryAnalytics.evaluteResults(holder)
+            return
+        from sklearn.metrics import accuracy_score, classification_report
+        from CompiledModels import CompiledModels
+        result = Cli.predictFrame(args)
+        result = result[result['transportation_mode'].isin(Cli.cascadeClasses(CompiledModels.loadCascade(args.model)))]
+        actual = result['transportation_mode'].astype(str)
+        print(classification_report(actual, result['predicted'], zero_division=0))
+        print('Accuracy {:.4f} on {} sub trajectories'.format(accuracy_score(actual, result['predicted']), len(result)))
+
+    def parser():
+        parser = argparse.ArgumentParser(prog='Cli.py', description='Predicting transportation modes of GPS trajectories')
+        Instrumentation.addArguments(parser)
+        commands = parser.add_subparsers(dest='command', required=True)
+
+        def inputOptions(command):
+            command.add_argument('--chunk-size', type=int, default=None, help='stream the csv in chunks of rows')
+            command.add_argument('--users', type=int, nargs='+', default=None, help='only these t_user_id')
+
+        def featureOptions(command):
+            inputOptions(command)
+            command.add_argument('--precision', default='float64', choices=['float32', 'float64'],
+                                 help='float type of the point features, the coordinates are always float64')
+            command.add_argument('--gap-policy', default='wrap', choices=['wrap', 'zero', 'drop'])
+            command.add_argument('--features', nargs='+', default=[], help='extra point features')
+            command.add_argument('--window-size', type=int, default=None)
+            command.add_argument('--window-duration', type=int, default=None)
+            command.add_argument('--window-stride', type=int, default=None)
+            command.add_argument('--workers', type=int, default=1)
+
+        command = commands.add_parser('generate', help='synthetic csv in the schema of geolife_raw.csv')
+        command.add_argument('output')
+        command.add_argument('--points', type=int, default=10 ** 6)
+        command.add_argument('--synthetic-users', type=int, default=None, help='one per 10000 points by default')
+        command.add_argument('--seed', type=int, default=0)
+        command.add_argument('--all-modes', action='store_true',
+                             help='also bike, boat and the other modes the hierarchy does not classify')
+        command.set_defaults(run=Cli.generate)
+
+        command = commands.add_parser('ingest', help='step 1, csv to a point table')
+        command.add_argument('input')
+        command.add_argument('output')
+        inputOptions(command)
+        command.set_defaults(run=Cli.ingest)
+
+        command = commands.add_parser('featurize', help='steps 2 and 3, point table or csv to sub trajectories')
+        command.add_argument('input')
+        command.add_argument('output')
+        featureOptions(command)
+        command.set_defaults(run=Cli.featurize)
+
+        command = commands.add_parser('train', help='fitting the classifier hierarchy on sub trajectories')
+        command.add_argument('input')
+        command.add_argument('model')
+        command.add_argument('--classifier', default='rf', help='rf, dt or the dotted path of a tree or forest '
+                             'classifier, for the nodes of the cascade that do not name their own')
+        command.add_argument('--cascade', default=None, help='JSON file of the hierarchy (see Cascade)')
+        command.add_argument('--workers', type=int, default=1,
+                             help='cores for fitting the nodes concurrently (0 for all of them)')
+        command.set_defaults(run=Cli.train)
+
+        command = commands.add_parser('predict', help='modes of the sub trajectories (or of a csv) as a csv')
+        command.add_argument('input')
+        command.add_argument('model')
+        command.add_argument('output')
+        featureOptions(command)
+        command.set_defaults(run=Cli.predict)
+
+        command = commands.add_parser('evaluate', help='scores of a model, or the cross validation of step 6')
+        command.add_argument('input')
+        group = command.add_mutually_exclusive_group(required=True)
+        group.add_argument('--model')
+        group.add_argument('--cv', action='store_true')
+        featureOptions(command)
+        command.set_defaults(run=Cli.evaluate)
+        return parser
+
+    def main(argv=None):
+        args = Cli.parser().parse_args(argv)
+        Instrumentation.fromArguments(args)
+        with Instrumentation.stage(args.command):
+            args.run(args)
+
+
+if __name__ == '__main__':
+    Cli.main(sys.argv[1:])
@@ -0,0 +1,143 @@
+import json
+import numpy as np
+
+
+class CompiledModel:
+    '''
+    A fitted scikit-learn DecisionTreeClassifier or RandomForestClassifier reduced to the node
+    arrays of its trees. The nodes of all the trees are concatenated, tree t starting at node
+    roots[t], so every row walks down every tree in the same vectorized loop. predict gives the
+    same labels as the original estimator, but only needs NumPy, so a saved hierarchy can be
+    loaded and applied without importing scikit-learn.
+    '''
+    fields = ['roots', 'left', 'right', 'feature', 'threshold', 'value', 'missingLeft']
+
+    def __init__(self, kind, classes, nodes):
+        # kind is 'tree' or 'forest', nodes a dict of the arrays named in CompiledModel.fields
+        self.kind = kind
+        self.classes = classes
+        self.nodes = nodes
+
+    # Leaf reached in every tree by every row of X, as a (rows, trees) array. Rows go left where
+    # X[row, feature] <= threshold like in scikit-learn, which compares the features as float32.
+    def leaves(self, X):
+        roots = self.nodes['roots']
+        node = np.tile(roots, len(X))
+        rowOf = np.repeat(np.arange(len(X)), len(roots))
+        paths = np.arange(len(node))
+        while len(paths):
+            current = node[paths]
+            left = self.nodes['left'][current]
+            inner = left != -1
+            paths, current, left = paths[inner], current[inner], left[inner]
+            values = X[rowOf[paths], self.nodes['feature'][current]]
+            goLeft = values <= self.nodes['threshold'][current]
+            missing = np.isnan(values)
+            if missing.any():
+                goLeft[missing] = self.nodes['missingLeft'][current[missing]]
+            node[paths] = np.where(goLeft, left, self.nodes['right'][current])
+        return node.reshape(len(X), len(roots))
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        leaves = self.leaves(X)
+        proba = np.zeros((len(X), len(self.classes)))
+        # Adding the trees one after the other like scikit-learn does, so the sums are the same
+        for tree in range(leaves.shape[1]):
+            proba += self.nodes['value'][leaves[:, tree]]
+        if self.kind == 'forest':
+            proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+class CompiledModels:
+    '''
+    Compiling the estimators of a classifier hierarchy (a dict like the modelDic of
+    Classifiers.fitHierarchyRFC) and storing them in one .npz file of plain arrays, together
+    with the configuration of the hierarchy (see Cascade) as a JSON string.
+    '''
+
+    def compileTree(tree, offset, normalize):
+        value = tree.value[:, 0, :].astype(np.float64)
+        if normalize:
+            # A forest averages the class fractions of its trees, a single tree takes the
+            # argmax of the leaf values as they are
+            normalizer = value.sum(axis=1)[:, None]
+            normalizer[normalizer == 0.0] = 1.0
+            value = value / normalizer
+        missingLeft = getattr(tree, 'missing_go_to_left', None)
+        return {'left': np.where(tree.children_left == -1, -1, tree.children_left + offset),
+                'right': np.where(tree.children_right == -1, -1, tree.children_right + offset),
+                'feature': tree.feature, 'threshold': tree.threshold, 'value': value,
+                'missingLeft': (np.zeros(tree.node_count, dtype=bool) if missingLeft is None
+                                else np.asarray(missingLeft, dtype=bool))}
+
+    # Estimators that are plain trees or forests averaging the class fractions of their trees.
+    # Other ensembles weight their trees (AdaBoost) or give them subsets of the features (Bagging),
+    # so compiling them as a forest would predict other labels.
+    def compilable():
+        from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+        from sklearn.tree import DecisionTreeClassifier
+        return {'tree': (DecisionTreeClassifier,), 'forest': (RandomForestClassifier, ExtraTreesClassifier)}
+
+    def kindOf(estimator):
+        for kind, types in CompiledModels.compilable().items():
+            if isinstance(estimator, types):
+                return kind
+        raise ValueError('Only DecisionTreeClassifier, RandomForestClassifier and ExtraTreesClassifier can be '
+                         'compiled, not {}'.format(type(estimator).__name__))
+
+    # Raising before anything is trained when a node of the cascade has an estimator that cannot be compiled
+    def checkCascade(cascade, estimator='rf'):
+        from Cascade import Cascade
+        for node in Cascade.nodes(cascade or Cascade.hierarchy):
+            try:
+                CompiledModels.kindOf(Cascade.estimator(node, estimator))
+            except ValueError as error:
+                raise ValueError('Node {}: {}'.format(node['name'], error))
+
+    def compile(estimator):
+        kind = CompiledModels.kindOf(estimator)
+        trees = [tree.tree_ for tree in estimator.estimators_] if kind == 'forest' else [estimator.tree_]
+        roots = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+        parts = [CompiledModels.compileTree(tree, offset, kind == 'forest') for tree, offset in zip(trees, roots)]
+        nodes = {field: np.concatenate([part[field] for part in parts]) for field in parts[0]}
+        nodes['roots'] = roots
+        for field in ['roots', 'left', 'right', 'feature']:
+            nodes[field] = nodes[field].astype(np.intp)
+        return CompiledModel(kind, np.asarray(estimator.classes_), nodes)
+
+    def save(modelDic, fileName, cascade=None):
+        arrays = {}
+        if cascade is not None:
+            arrays['cascade'] = np.array(json.dumps(cascade))
+        for name, model in modelDic.items():
+            if not isinstance(model, CompiledModel):
+                model = CompiledModels.compile(model)
+            arrays['{}.kind'.format(name)] = np.array(model.kind)
+            arrays['{}.classes'.format(name)] = model.classes
+            for field in CompiledModel.fields:
+                arrays['{}.{}'.format(name, field)] = model.nodes[field]
+        with open(fileName, 'wb') as f:
+            np.savez(f, **arrays)
+
+    def load(fileName):
+        '''
+        Param :- fileName of CompiledModels.save
+        Return :- dict of name -> CompiledModel, usable wherever the fitted modelDic is
+        '''
+        modelDic = {}
+        with np.load(fileName, allow_pickle=False) as arrays:
+            for name in sorted(set(key.split('.')[0] for key in arrays.files if '.' in key)):
+                nodes = {field: arrays['{}.{}'.format(name, field)] for field in CompiledModel.fields}
+                modelDic[name] = CompiledModel(str(arrays['{}.kind'.format(name)]), arrays['{}.classes'.format(name)],
+                                               nodes)
+        return modelDic
+
+    # The configuration of the hierarchy stored with the models, None for Cascade.hierarchy
+    def loadCascade(fileName):
+        with np.load(fileName, allow_pickle=False) as arrays:
+            return json.loads(str(arrays['cascade'])) if 'cascade' in arrays.files else None
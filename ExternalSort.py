@@ -0,0 +1,99 @@
+import csv
+import heapq
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from Ingestion import *
+
+
+class ExternalSort:
+    '''
+    Sorting a csv file larger than memory by 't_user_id' and 'collected_time'. The file is
+    read in chunks, every chunk is sorted on its own and spilled to disk as a sorted run, and
+    the runs are then merged with a k-way merge into the output file. At most one chunk of
+    rows is in memory at any time.
+    '''
+
+    # Sort key of every point of a chunk: the user id and the epoch seconds of 'collected_time'.
+    def chunkKeys(chunk):
+        return chunk['t_user_id'].values, Preprocessing.parseTimestamps(chunk['collected_time'].values)
+
+    # Fast pre-check, one streaming pass over the file. The file is sorted when 't_user_id'
+    # never decreases and the time never decreases within a user, also across chunk borders.
+    def isSorted(fileName, chunkSize=None):
+        last = None
+        for chunk in Ingestion.readChunks(fileName, chunkSize):
+            userIds, epoch = ExternalSort.chunkKeys(chunk)
+            if last is not None:
+                userIds = np.concatenate(([last[0]], userIds))
+                epoch = np.concatenate(([last[1]], epoch))
+            sameUser = userIds[1:] == userIds[:-1]
+            if np.any(userIds[1:] < userIds[:-1]) or np.any(sameUser & (epoch[1:] < epoch[:-1])):
+                return False
+            last = (userIds[-1], epoch[-1])
+        return True
+
+    # Sorting every chunk in memory and writing it to its own run file in tmpDir.
+    def spillRuns(fileName, chunkSize, tmpDir):
+        runs = []
+        for chunk in Ingestion.readChunks(fileName, chunkSize):
+            userIds, epoch = ExternalSort.chunkKeys(chunk)
+            order = Preprocessing.sortPoints(userIds, epoch)
+            runName = os.path.join(tmpDir, 'run{}.csv'.format(len(runs)))
+            chunk.iloc[order].to_csv(runName, index=False)
+            runs.append(runName)
+        return runs
+
+    # Reading one sorted run back in small chunks, yielding (t_user_id, epoch, row) per point.
+    def readRun(runName, chunkSize):
+        for chunk in pd.read_csv(runName, chunksize=chunkSize):
+            userIds, epoch = ExternalSort.chunkKeys(chunk)
+            rows = zip(*[chunk[name].tolist() for name in Ingestion.inputColumns])
+            for row in zip(userIds.tolist(), epoch.tolist(), rows):
+                yield row
+
+    # k-way merge of the sorted runs. heapq.merge is stable, so points with the same key keep
+    # the order they had in the input file.
+    def mergeRuns(runs, outName, chunkSize):
+        readSize = max(1, chunkSize // max(1, len(runs)))
+        merged = heapq.merge(*[ExternalSort.readRun(runName, readSize) for runName in runs],
+                             key=lambda point: (point[0], point[1]))
+        with open(outName, 'w', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(Ingestion.inputColumns)
+            batch = []
+            for point in merged:
+                batch.append(point[2])
+                if len(batch) >= readSize:
+                    writer.writerows(batch)
+                    batch = []
+            writer.writerows(batch)
+
+    def sortFile(fileName, outName, chunkSize=None, tmpDir=None):
+        '''
+        Externally sorting fileName by 't_user_id' and 'collected_time' into outName.
+        The sorted runs are spilled into a temporary directory under tmpDir which is
+        removed afterwards.
+        Param :- fileName, outName, chunkSize, tmpDir
+        Return :- outName
+        '''
+        chunkSize = chunkSize or Ingestion.chunkSize
+        runDir = tempfile.mkdtemp(prefix='trajectory_sort_', dir=tmpDir)
+        try:
+            runs = ExternalSort.spillRuns(fileName, chunkSize, runDir)
+            ExternalSort.mergeRuns(runs, outName, chunkSize)
+        finally:
+            shutil.rmtree(runDir, ignore_errors=True)
+        return outName
+
+    # Returning a file that is sorted by 't_user_id' and 'collected_time'. If the input already
+    # is (the common case for our exports) it is returned as is, otherwise it is sorted into a
+    # new temporary csv file which the caller has to remove.
+    def ensureSorted(fileName, chunkSize=None, tmpDir=None):
+        if ExternalSort.isSorted(fileName, chunkSize):
+            return fileName
+        handle, outName = tempfile.mkstemp(prefix='trajectory_sorted_', suffix='.csv', dir=tmpDir)
+        os.close(handle)
+        return ExternalSort.sortFile(fileName, outName, chunkSize, tmpDir)
@@ -0,0 +1,145 @@
+import numpy as np
+from Utils import *
+from Preprocessing import *
+from Segments import *
+from SegmentStats import *
+from Instrumentation import *
+
+
+class FeatureRegistry:
+    '''
+    Registry of the point features. Every feature is a function of the filtered point table,
+    the values already computed and a context dict (precision, gapPolicy, segment offsets,
+    thresholds), declared together with the features it depends on. compute resolves the
+    requested features and their dependencies into one plan and evaluates every entry exactly
+    once, so intermediates such as the radians of the coordinates or the time gaps are shared
+    by all the features that need them. Names starting with '_' are intermediates only.
+    '''
+    features = {}
+    # Point features every run computes, in the order of the sub trajectory columns
+    defaults = ['distance', 'speed', 'acceleration', 'bearing']
+    # Short names used in the sub trajectory column names, e.g. 'meanDis'
+    shortNames = {'distance': 'Dis', 'speed': 'Speed', 'acceleration': 'Acc', 'bearing': 'Brng'}
+    # Speed in m/s below which a pair counts as a stop
+    stopSpeed = 0.5
+
+    # Decorator registering a feature function under name
+    def register(name, dependencies=()):
+        def decorator(function):
+            FeatureRegistry.features[name] = (list(dependencies), function)
+            return function
+        return decorator
+
+    # Order in which the requested features and all their dependencies have to be computed
+    def plan(names):
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name not in FeatureRegistry.features:
+                raise KeyError('Unknown point feature {}'.format(name))
+            if name in visiting:
+                raise ValueError('Circular dependency on point feature {}'.format(name))
+            visiting.add(name)
+            for dependency in FeatureRegistry.features[name][0]:
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    def compute(table, names, context):
+        '''
+        Computing the requested point features of a filtered point table.
+        Param :- table, names, context
+        Return :- dict of feature name -> numpy array, only for the requested names
+        '''
+        values = {}
+        for name in FeatureRegistry.plan(names):
+            dependencies, function = FeatureRegistry.features[name]
+            with Instrumentation.stage(name, len(table['t_user_id'])):
+                values[name] = function(table, values, context)
+        return {name: values[name] for name in names}
+
+    # The requested features with the defaults always first, so the columns 0-19 of the sub
+    # trajectory features keep their meaning
+    def withDefaults(names=()):
+        return FeatureRegistry.defaults + [name for name in names if name not in FeatureRegistry.defaults]
+
+    def shortName(name):
+        return FeatureRegistry.shortNames.get(name, name[0].upper() + name[1:])
+
+    # Columns of the sub trajectory rows for the given point features, Utils.columns for the defaults
+    def subTrajectoryColumns(names):
+        return Utils.columns[:4] + [statistic + FeatureRegistry.shortName(name) for name in names
+                                    for statistic in SegmentStats.statistics]
+
+    # Change of a per pair value to the next pair divided by the time gap, 0 where there is no
+    # time gap and on the last pair of every sub trajectory, in the precision of the context
+    def rateOfChange(change, values, context):
+        rate = np.zeros(len(values['_time']), dtype=context['precision'])
+        valid = values['_time'] != 0
+        valid &= ~values['_lastRow']
+        np.divide(change, values['_time'][:-1], out=rate[:-1], where=valid[:-1])
+        return rate
+
+
+@FeatureRegistry.register('_radians')
+def radiansFeature(table, values, context):
+    return Utils.radiansOf(table['latitude_Start'], table['longitude_Start'],
+                           table['latitude_End'], table['longitude_End'], context['precision'])
+
+
+@FeatureRegistry.register('_time')
+def timeFeature(table, values, context):
+    return Preprocessing.timeDeltas(table, context['gapPolicy'])
+
+
+@FeatureRegistry.register('_lastRow')
+def lastRowFeature(table, values, context):
+    return Segments.lastRowMask(context['ends'], len(table['t_user_id']))
+
+
+@FeatureRegistry.register('distance', ['_radians'])
+def distanceFeature(table, values, context):
+    return Utils.haversineRadians(*values['_radians'], dtype=context['precision'])
+
+
+@FeatureRegistry.register('bearing', ['_radians'])
+def bearingFeature(table, values, context):
+    return Utils.bearingRadians(*values['_radians'], dtype=context['precision'])
+
+
+@FeatureRegistry.register('speed', ['distance', '_time'])
+def speedFeature(table, values, context):
+    time = values['_time']
+    return np.divide(values['distance'], time, out=np.zeros(len(time), dtype=context['precision']), where=time != 0)
+
+
+@FeatureRegistry.register('acceleration', ['speed', '_time', '_lastRow'])
+def accelerationFeature(table, values, context):
+    speed = values['speed']
+    return FeatureRegistry.rateOfChange(speed[1:] - speed[:-1], values, context)
+
+
+@FeatureRegistry.register('jerk', ['acceleration', '_time', '_lastRow'])
+def jerkFeature(table, values, context):
+    acceleration = values['acceleration']
+    return FeatureRegistry.rateOfChange(acceleration[1:] - acceleration[:-1], values, context)
+
+
+# Change of bearing to the next pair in degrees per second, the change is wrapped into [-180, 180)
+@FeatureRegistry.register('bearingRate', ['bearing', '_time', '_lastRow'])
+def bearingRateFeature(table, values, context):
+    bearing = values['bearing'].astype(np.float64)
+    change = np.mod(bearing[1:] - bearing[:-1] + 180, 360) - 180
+    return FeatureRegistry.rateOfChange(change, values, context)
+
+
+@FeatureRegistry.register('stop', ['speed'])
+def stopFeature(table, values, context):
+    return (values['speed'] < context.get('stopSpeed', FeatureRegistry.stopSpeed)).astype(np.int8)
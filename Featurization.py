@@ -0,0 +1,107 @@
+import numpy as np
+from Utils import *
+from Preprocessing import *
+from Segments import *
+from SegmentStats import *
+from FeatureRegistry import *
+from Instrumentation import *
+
+
+class Featurization:
+    '''
+    Steps 2 and 3 of the pipeline as plain functions of a point table, so they can be run on
+    any part of the data (a whole file, one user, a few user-days) with the same results.
+    '''
+    # Sub trajectories with this many points or less are dropped
+    minPoints = 10
+
+    def pointFeatures(pointTable, features, precision='float64', gapPolicy='wrap', excludedModes=(), minPoints=None):
+        '''
+        Filtering the pairs and calculating the point features (see FeatureRegistry).
+        Segments of the excludedModes and segments with minPoints pairs or less are dropped
+        before any feature is computed. Features never look beyond their own segment, so the
+        remaining segments get the same values and keep their 'flag'.
+        Param :- pointTable, features, precision, gapPolicy, excludedModes, minPoints
+        Return :- (point table with 'flag' and the feature columns added, (starts, ends) of the segments)
+        '''
+        with Instrumentation.stage('filterPairs', len(pointTable['t_user_id'])) as span:
+            filteredTable = Preprocessing.filterTable(pointTable, Preprocessing.pairMask(pointTable, gapPolicy))
+            span['rowsOut'] = len(filteredTable['t_user_id'])
+
+        # Here we are creating a flag numerical column so as to easily find when there is a change in subtrajectory or trajectory.
+        # The offsets of the sub trajectories are kept as well so that the later steps never have to regroup the rows.
+        with Instrumentation.stage('segments', len(filteredTable['t_user_id'])) as span:
+            subTrajGrper, starts, ends = Segments.split(filteredTable)
+            filteredTable, subTrajGrper, starts, ends = Featurization.dropSegments(filteredTable, subTrajGrper, starts,
+                                                                                  ends, excludedModes, minPoints)
+            span['rowsOut'] = len(starts)
+        values = Featurization.featureValues(filteredTable, features, precision, gapPolicy, starts, ends)
+
+        # Here we are adding the point features as new columns to our preprocessed data, no row is copied.
+        return dict(filteredTable, flag=subTrajGrper, **values), (starts, ends)
+
+    # Dropping the segments of the excludedModes and the ones with minPoints pairs or less
+    def dropSegments(table, flag, starts, ends, excludedModes=(), minPoints=None):
+        if not excludedModes and minPoints is None:
+            return table, flag, starts, ends
+        keep = ~np.isin(table['transportation_mode'][starts], [Utils.modeCode(mode) for mode in excludedModes])
+        if minPoints is not None:
+            keep &= (ends - starts) > minPoints
+        return Featurization.selectSegments(table, flag, starts, ends, keep)
+
+    # Calculating distance, time, speed, acceleration and bearing (and any extra feature) for all the pairs at once.
+    # The acceleration is masked to 0 where there is no time gap and on the last pair of every sub trajectory,
+    # where the next pair belongs to another user, mode or date.
+    def featureValues(table, features, precision, gapPolicy, starts, ends):
+        context = {'precision': precision, 'gapPolicy': gapPolicy, 'starts': starts, 'ends': ends}
+        return FeatureRegistry.compute(table, features, context)
+
+    # The rows of the segments where keep is True, with the offsets of the segments in the new table
+    def selectSegments(table, flag, starts, ends, keep):
+        if keep.all():
+            return table, flag, starts, ends
+        starts, ends = starts[keep], ends[keep]
+        counts = ends - starts
+        offsets = np.cumsum(counts)
+        index = np.repeat(starts - (offsets - counts), counts) + np.arange(offsets[-1] if len(offsets) else 0)
+        return ({name: column[index] for name, column in table.items()}, flag[index],
+                offsets - counts, offsets)
+
+    keyColumns = ['t_user_id', 'transportation_mode', 'date_Start', 'flag']
+
+    def subTrajectoryArrays(points, segments, features, minPoints=None, excludedModes=None):
+        '''
+        Statistics of the point features over every sub trajectory with more than minPoints
+        points, without the excluded modes (Utils.excludedModes by default).
+        Param :- points, segments, features, minPoints, excludedModes
+        Return :- (dict of the 4 key columns, matrix with 5 statistics per feature), one row per sub trajectory
+        '''
+        starts, ends = segments
+        keep = (ends - starts) > (Featurization.minPoints if minPoints is None else minPoints)
+        # Filtering the subrajectories of motorcycle and run
+        excluded = [Utils.modeCode(mode) for mode in (Utils.excludedModes if excludedModes is None else excludedModes)]
+        keep &= ~np.isin(points['transportation_mode'][starts], excluded)
+        starts, ends = starts[keep], ends[keep]
+
+        # Calculating all the statistical values for A2. Here we calculate the minimum, maximum, mean,
+        # median and standard deviation of distance, speed, acceleration, bearing and the extra point
+        # features for all the subtrajectories at once.
+        with Instrumentation.stage('segmentStats', len(points['flag'])) as span:
+            values = np.column_stack([points[name] for name in features])
+            stats = SegmentStats.compute(values, starts, ends)
+            span['rowsOut'] = len(stats)
+        return {name: points[name][starts] for name in Featurization.keyColumns}, stats
+
+    # The sub trajectory rows as lists, the 4 key columns followed by the statistics
+    def toRows(keys, stats):
+        keys = zip(*[np.asarray(keys[name]).tolist() for name in Featurization.keyColumns])
+        return [list(key) + row for key, row in zip(keys, np.asarray(stats).tolist())]
+
+    def subTrajectories(points, segments, features, minPoints=None, excludedModes=None):
+        '''
+        The rows of subTrajectoryArrays.
+        Param :- points, segments, features, minPoints, excludedModes
+        Return :- list of rows, the 4 key columns followed by 5 statistics per feature
+        '''
+        return Featurization.toRows(*Featurization.subTrajectoryArrays(points, segments, features, minPoints,
+                                                                       excludedModes))
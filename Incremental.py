@@ -0,0 +1,149 @@
+import json
+import os
+import numpy as np
+from Utils import *
+from Preprocessing import *
+from PointCache import *
+from FeatureRegistry import *
+from Featurization import *
+
+
+class Incremental:
+    '''
+    Incremental featurization. The points and the sub trajectory rows are persisted in a store
+    directory, and update() only recomputes the user-days touched by new points.
+    Pairs never cross midnight, so a user-day is the smallest unit whose segments do not depend
+    on anything else. A (user, mode, date) segment is not enough: one new point of another mode
+    can split a segment in two, so every segment of a touched user-day is recomputed.
+    Store layout (every table is a PointCache entry of .npy columns):-
+    points/<t_user_id> :- the points of one user, sorted by time
+    rows :- the sub trajectory rows, with 'flag' numbering the segments within their user-day
+    days :- t_user_id, day and the number of segments (short ones included) of every user-day
+    '''
+    pointColumns = ['t_user_id', 'transportation_mode', 'epoch', 'latitude', 'longitude']
+
+    def __init__(self, storeDir, precision='float64', gapPolicy='wrap', extraPointFeatures=()):
+        self.storeDir = storeDir
+        self.precision = precision
+        self.gapPolicy = gapPolicy
+        self.pointFeatures = FeatureRegistry.withDefaults(extraPointFeatures)
+        self.columns = FeatureRegistry.subTrajectoryColumns(self.pointFeatures)
+        self.checkParameters()
+
+    # A store is only valid for the parameters it was built with
+    def checkParameters(self):
+        parameters = {'precision': self.precision, 'gapPolicy': self.gapPolicy, 'pointFeatures': self.pointFeatures}
+        path = os.path.join(self.storeDir, 'parameters.json')
+        if os.path.isfile(path):
+            with open(path) as f:
+                stored = json.load(f)
+            if stored != parameters:
+                raise ValueError('Store {} was built with {}, not {}'.format(self.storeDir, stored, parameters))
+        else:
+            os.makedirs(self.storeDir, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(parameters, f)
+
+    # One int64 key per (user, day) for set operations
+    def userDayKeys(userIds, days):
+        return (np.asarray(userIds, dtype=np.int64) << 32) | np.asarray(days, dtype=np.int64)
+
+    # A stored table, or None before the first update
+    def loadTable(self, key, columns):
+        table = PointCache.load(self.storeDir, key)
+        if table is None:
+            return None
+        return {name: np.asarray(table[name]) for name in columns}
+
+    # The rows of the stored table outside the dirty user-days with the new rows appended
+    def replaceTable(self, key, new, dirty, dayColumn):
+        stored = self.loadTable(key, list(new))
+        if stored is None:
+            return new
+        keep = ~np.isin(Incremental.userDayKeys(stored['t_user_id'], stored[dayColumn]), dirty)
+        return {name: np.concatenate((stored[name][keep], new[name])).astype(stored[name].dtype)
+                for name in new}
+
+    # Merging the new points of one user into the stored ones, points with the same timestamp
+    # keep the order in which they were added
+    def mergeUserPoints(self, userId, points):
+        pointsDir = os.path.join(self.storeDir, 'points')
+        stored = PointCache.load(pointsDir, str(userId))
+        if stored is not None:
+            points = {name: np.concatenate((stored[name], points[name])) for name in Incremental.pointColumns}
+            order = np.argsort(points['epoch'], kind='stable')
+            points = {name: column[order] for name, column in points.items()}
+        PointCache.save(pointsDir, str(userId), points)
+        return points
+
+    # Sub trajectory rows and segment counts of the given days of one user
+    def featurizeDays(self, points, days):
+        pointDays = points['epoch'] // 86400
+        mask = np.isin(pointDays, days)
+        table = Preprocessing.buildPairs(*[points[name][mask] for name in Incremental.pointColumns])
+        dataA1Soln, segments = Featurization.pointFeatures(table, self.pointFeatures, self.precision, self.gapPolicy)
+        rows = Featurization.subTrajectories(dataA1Soln, segments, self.pointFeatures)
+        # Turning the flags into the number of the segment within its user-day, starting at 1
+        segmentDays = dataA1Soln['date_Start'][segments[0]]
+        uniqueDays, firstSegment, counts = np.unique(segmentDays, return_index=True, return_counts=True)
+        dayFirst = dict(zip(uniqueDays.tolist(), firstSegment.tolist()))
+        for row in rows:
+            row[3] = row[3] - dayFirst[row[2]]
+        return rows, uniqueDays, counts
+
+    def update(self, fileName):
+        '''
+        Adding the points of a new csv file and recomputing the sub trajectories of the
+        user-days they touch, everything else in the store stays as it is.
+        Param :- fileName
+        Return :- array of the (user, day) keys that were recomputed
+        '''
+        userIds, modes, epoch, latitude, longitude = Preprocessing.readPoints(fileName)
+        newPoints = dict(zip(Incremental.pointColumns, (userIds, modes, epoch, latitude, longitude)))
+        rows, dayUsers, dayNumbers, dayCounts, dirty = [], [], [], [], []
+        for userId in np.unique(userIds):
+            mask = userIds == userId
+            points = self.mergeUserPoints(userId, {name: column[mask] for name, column in newPoints.items()})
+            days = np.unique(epoch[mask] // 86400)
+            dirty.append(Incremental.userDayKeys(np.full(len(days), userId), days))
+            userRows, segmentDays, counts = self.featurizeDays(points, days)
+            rows += userRows
+            dayUsers.append(np.full(len(segmentDays), userId))
+            dayNumbers.append(segmentDays)
+            dayCounts.append(counts)
+        dirty = np.concatenate(dirty) if dirty else np.zeros(0, dtype=np.int64)
+        self.replaceRows(dirty, rows)
+        self.replaceDays(dirty, np.concatenate(dayUsers or [[]]), np.concatenate(dayNumbers or [[]]),
+                         np.concatenate(dayCounts or [[]]))
+        return dirty
+
+    # Replacing the stored rows of the dirty user-days by the recomputed ones
+    def replaceRows(self, dirty, rows):
+        new = {name: np.asarray(values) for name, values in zip(self.columns, zip(*rows))} if rows else \
+            {name: np.zeros(0, dtype=np.int32 if index < 4 else np.float64) for index, name in enumerate(self.columns)}
+        table = self.replaceTable('rows', new, dirty, 'date_Start')
+        order = np.lexsort((table['flag'], table['date_Start'], table['t_user_id']))
+        PointCache.save(self.storeDir, 'rows', {name: column[order] for name, column in table.items()})
+
+    def replaceDays(self, dirty, userIds, days, counts):
+        new = {'t_user_id': np.asarray(userIds, dtype=np.int32), 'day': np.asarray(days, dtype=np.int32),
+               'segments': np.asarray(counts, dtype=np.int64)}
+        table = self.replaceTable('days', new, dirty, 'day')
+        order = np.lexsort((table['day'], table['t_user_id']))
+        PointCache.save(self.storeDir, 'days', {name: column[order] for name, column in table.items()})
+
+    def subTrajectories(self):
+        '''
+        All the sub trajectory rows of the store, with 'flag' numbered over the whole data set
+        exactly like a full run of calculateSubTrajectories would number it.
+        Return :- list of rows
+        '''
+        rows = self.loadTable('rows', self.columns)
+        days = self.loadTable('days', ['t_user_id', 'day', 'segments'])
+        if rows is None or len(rows['flag']) == 0:
+            return []
+        offsets = np.cumsum(days['segments']) - days['segments']
+        position = np.searchsorted(Incremental.userDayKeys(days['t_user_id'], days['day']),
+                                   Incremental.userDayKeys(rows['t_user_id'], rows['date_Start']))
+        rows['flag'] = rows['flag'] + offsets[position]
+        return [list(row) for row in zip(*[rows[name].tolist() for name in self.columns])]
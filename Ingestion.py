@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+from Preprocessing import *
+from Segments import *
+from Featurization import *
+from Windows import *
+from Instrumentation import *
+
+
+class Ingestion:
+    '''
+    Streaming ingestion of the GPS csv file. The file is read in chunks of chunkSize rows so
+    only one chunk of raw strings is resident at a time. The input has to be sorted by
+    't_user_id' and 'collected_time' already (the whole file is never sorted here).
+    preProcess still returns the whole point table, so its memory grows with the input (as
+    the filtered pairs, not the raw strings). subTrajectoryArrays runs steps 2 and 3 user by
+    user instead and only keeps the sub trajectory rows, so memory is bounded by a chunk and
+    the largest user.
+    '''
+    chunkSize = 1000000
+    inputColumns = ['t_user_id', 'collected_time', 'latitude', 'longitude', 'transportation_mode']
+
+    def readChunks(fileName, chunkSize=None, dtype=None):
+        return pd.read_csv(fileName, usecols=Ingestion.inputColumns, dtype=dtype,
+                           chunksize=chunkSize or Ingestion.chunkSize)
+
+    # Reading the file chunk by chunk and yielding the points of every chunk as column arrays
+    # (user ids, modes, epoch seconds, latitude, longitude). The last point of each chunk is
+    # carried over and put in front of the next chunk, so the pair formed by the last point of
+    # one chunk and the first point of the next one is never lost. With users the points of
+    # other users are dropped from every chunk before anything is parsed.
+    def streamPoints(fileName, chunkSize=None, users=None):
+        carried = None
+        for chunk in Ingestion.readChunks(fileName, chunkSize, Preprocessing.inputDtypes()):
+            if users is not None:
+                chunk = chunk[chunk['t_user_id'].isin(users)]
+                if len(chunk) == 0:
+                    continue
+            with Instrumentation.stage('parseChunk', len(chunk)):
+                points = (chunk['t_user_id'].values,
+                          Preprocessing.encodeModes(chunk['transportation_mode']),
+                          Preprocessing.parseTimestamps(chunk['collected_time'].values),
+                          chunk['latitude'].values,
+                          chunk['longitude'].values)
+            if carried is not None:
+                points = tuple(np.concatenate((last, column)) for last, column in zip(carried, points))
+            carried = tuple(column[-1:] for column in points)
+            yield points
+
+    # Generator of per-user segments. Every chunk is cut wherever 't_user_id' changes and
+    # each piece is yielded as (t_user_id, point table) with the same columns as
+    # Preprocessing.preProcess. A user spread over several chunks comes out as several
+    # consecutive pieces, the pieces never overlap in pairs.
+    def streamUserSegments(fileName, chunkSize=None, users=None):
+        for userIds, modes, epoch, latitude, longitude in Ingestion.streamPoints(fileName, chunkSize, users):
+            # The carried point starts every chunk but the first one. It has already been
+            # yielded as the end of the previous piece, here it only opens the next pair.
+            cuts = np.flatnonzero(userIds[1:] != userIds[:-1]) + 1
+            starts = np.concatenate(([0], cuts))
+            ends = np.concatenate((cuts, [len(userIds)]))
+            for start, end in zip(starts, ends):
+                if end - start < 2:
+                    continue
+                yield (userIds[start],
+                       Preprocessing.buildPairs(userIds[start:end], modes[start:end], epoch[start:end],
+                                                latitude[start:end], longitude[start:end]))
+
+    # Concatenating the tables column by column. The pieces of a column are released as soon as
+    # it is joined, so the pieces and the result are never both held in full.
+    def concatTables(tables):
+        columns = {}
+        for table in tables:
+            for name, column in table.items():
+                columns.setdefault(name, []).append(column)
+        if not columns:
+            return {name: np.empty(0) for name in Utils.pointColumns}
+        for name in list(columns):
+            columns[name] = np.concatenate(columns[name])
+        return columns
+
+    # The pieces of streamUserSegments joined into one point table per user, as (t_user_id,
+    # point table). Segments can cross chunk boundaries, so a user is only yielded once the
+    # next user starts.
+    def streamUsers(fileName, chunkSize=None, users=None):
+        pending, pendingUser = [], None
+        for userId, table in Ingestion.streamUserSegments(fileName, chunkSize, users):
+            if pending and userId != pendingUser:
+                yield pendingUser, Ingestion.concatTables(pending)
+                pending = []
+            pending.append(table)
+            pendingUser = userId
+        if pending:
+            yield pendingUser, Ingestion.concatTables(pending)
+
+    def selectUsers(fileName, users, chunkSize=None, gapPolicy='wrap'):
+        '''
+        The filtered pairs of some users of a sorted csv in one pass, which stops after the last
+        of them. The pairs of the other users are filtered and split into segments but only
+        counted, so the flags of the selected users can be numbered like in the whole table
+        (see offsetFlags).
+        Param :- fileName, users, chunkSize, gapPolicy
+        Return :- (point table of the users, dict t_user_id -> number of segments of the other
+        users before it)
+        '''
+        selected = set(int(userId) for userId in users)
+        tables, skipped, count = [], {}, 0
+        for userId, table in Ingestion.streamUsers(fileName, chunkSize):
+            table = Preprocessing.filterTable(table, Preprocessing.pairMask(table, gapPolicy))
+            if int(userId) in selected:
+                tables.append(table)
+                skipped[int(userId)] = count
+                if len(skipped) == len(selected):
+                    break
+            else:
+                count += len(Segments.split(table)[1])
+        return Ingestion.concatTables(tables), skipped
+
+    # The 'flag' column of the users of selectUsers numbered like in the whole table
+    def offsetFlags(flag, userIds, skipped):
+        if not skipped:
+            return flag
+        users = np.array(sorted(skipped))
+        offsets = np.array([skipped[userId] for userId in users], dtype=np.int32)
+        return flag + offsets[np.searchsorted(users, userIds)]
+
+    def preProcess(fileName, chunkSize=None, users=None):
+        '''
+        Streaming counterpart of Preprocessing.preProcess for sorted input. The pairs of every
+        piece are filtered with Preprocessing.pairMask as soon as they are built, so only the
+        pairs that survive step 2 are kept in memory.
+        Param :- fileName, chunkSize, users (None for all of them)
+        Return :- dict of column name -> numpy array
+        '''
+        return Ingestion.concatTables(Preprocessing.filterTable(table, Preprocessing.pairMask(table))
+                                      for _, table in Ingestion.streamUserSegments(fileName, chunkSize, users))
+
+    def subTrajectoryArrays(fileName, features, chunkSize=None, precision=None, gapPolicy='wrap', users=None,
+                            window=None):
+        '''
+        Steps 1 to 3 on a sorted csv one user at a time, keeping only the sub trajectory rows.
+        The 'flag' of every user is offset by the segments of the users before it, the other
+        users included when only some are selected, so the rows are the same as the ones of the
+        whole table.
+        Param :- fileName, features, chunkSize, precision, gapPolicy, users (None for all of them),
+        window (dict of 'size', 'duration' and 'stride' as in Windows.subTrajectoryArrays, or None)
+        Return :- (dict of the 4 key columns, matrix with 5 statistics per feature)
+        '''
+        minPoints = None if window else Featurization.minPoints
+        selected = None if users is None else set(int(userId) for userId in users)
+        keys, stats, offset, done = [], [], 0, 0
+        for userId, table in Ingestion.streamUsers(fileName, chunkSize):
+            if selected is not None and done == len(selected):
+                break
+            # Filtered once here to count the segments of the user, filtering again keeps every pair
+            table = Preprocessing.filterTable(table, Preprocessing.pairMask(table, gapPolicy))
+            segmentCount = len(Segments.split(table)[1])
+            if selected is not None and int(userId) not in selected:
+                offset += segmentCount
+                continue
+            done += 1
+            points, segments = Featurization.pointFeatures(table, features, precision or Preprocessing.precision,
+                                                           gapPolicy, Utils.excludedModes, minPoints)
+            del table
+            if window:
+                userKeys, userStats = Windows.subTrajectoryArrays(points, segments, features, window.get('size'),
+                                                                  window.get('duration'), window.get('stride'))
+            else:
+                userKeys, userStats = Featurization.subTrajectoryArrays(points, segments, features)
+            # Dropped segments keep their number, so the offset counts every segment of the user
+            userKeys['flag'] = userKeys['flag'] + np.int32(offset)
+            offset += segmentCount
+            keys.append(userKeys)
+            stats.append(userStats)
+        if not keys:
+            return ({name: np.zeros(0, dtype=np.int32) for name in Featurization.keyColumns},
+                    np.zeros((0, 5 * len(features))))
+        return Ingestion.concatTables(keys), np.concatenate(stats)
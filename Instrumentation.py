@@ -0,0 +1,158 @@
+import contextlib
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+
+class JsonLinesSink:
+    '''
+    Sink writing every record as one line of JSON to a file (appended) or an open stream.
+    '''
+
+    def __init__(self, target):
+        self.stream = open(target, 'a') if isinstance(target, str) else target
+        self.owned = isinstance(target, str)
+
+    def __call__(self, record):
+        self.stream.write(json.dumps(record, sort_keys=True) + '\n')
+        self.stream.flush()
+
+    def close(self):
+        if self.owned:
+            self.stream.close()
+
+
+class Instrumentation:
+    '''
+    Timing and memory records of the stages of the pipeline and their sub-steps. Code marks a
+    stage with
+
+        with Instrumentation.stage('pointFeatures', rowsIn=n) as span:
+            ...
+            span['rowsOut'] = m
+
+    and when instrumentation is enabled every stage emits one record to the sinks when it ends:-
+    stage :- the names of the enclosing stages and its own joined with '/'
+    wall, cpu :- wall clock and CPU seconds of the process
+    maxRss :- peak resident set size of the process so far in bytes
+    memoryPeak :- peak of the Python allocations during the stage above the ones it started
+                  with, in bytes (only with traceMemory)
+    rowsIn, rowsOut :- when the code sets them, error :- the exception a stage ended with
+    A sink is any function taking the record dict, JsonLinesSink writes JSON lines. With a
+    profileDir the top level stages are also run under cProfile and their statistics written
+    to <profileDir>/<stage>.prof. Disabled (the default) a stage costs one function call.
+    '''
+    sinks = []
+    traceMemory = False
+    profileDir = None
+    # Open stages of every thread, every entry is [name, Python allocation peak of the stage so far,
+    # allocations at its start]
+    threadStages = threading.local()
+
+    def enable(sink=None, traceMemory=False, profileDir=None):
+        if sink is not None:
+            Instrumentation.sinks.append(sink)
+        if traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        Instrumentation.traceMemory = traceMemory
+        if profileDir:
+            os.makedirs(profileDir, exist_ok=True)
+        Instrumentation.profileDir = profileDir
+
+    def disable():
+        for sink in Instrumentation.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+        Instrumentation.sinks = []
+        if Instrumentation.traceMemory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        Instrumentation.traceMemory = False
+        Instrumentation.profileDir = None
+
+    # Command line options of the instrumentation, shared by the command line interfaces
+    def addArguments(parser):
+        parser.add_argument('--metrics', default=None,
+                            help='append a JSON line per stage to this file (- for stderr)')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='record the peak of the Python allocations of every stage')
+        parser.add_argument('--profile-dir', default=None, help='write a cProfile dump per top level stage here')
+
+    def fromArguments(args):
+        if args.metrics or args.profile_dir:
+            Instrumentation.enable(JsonLinesSink(sys.stderr if args.metrics == '-' else args.metrics)
+                                   if args.metrics else None, args.trace_memory, args.profile_dir)
+
+    def enabled():
+        return bool(Instrumentation.sinks) or Instrumentation.profileDir is not None
+
+    # Number of rows of a table (dict of columns), DataFrame or list, None for anything else
+    def rows(output):
+        if isinstance(output, dict):
+            return len(next(iter(output.values()))) if output else 0
+        if hasattr(output, '__len__') and not isinstance(output, str):
+            return len(output)
+        return None
+
+    def openStages():
+        if not hasattr(Instrumentation.threadStages, 'stack'):
+            Instrumentation.threadStages.stack = []
+        return Instrumentation.threadStages.stack
+
+    # Path of the innermost open stage of this thread, to pass on to the stages of a worker thread
+    def path():
+        return '/'.join(entry[0] for entry in Instrumentation.openStages()) or None
+
+    # Peak of the Python allocations since the last reset, the counter is reset afterwards so
+    # that every open stage can take its own maximum. The allocations are the ones of the whole
+    # process, so the peaks of stages running in threads include each other.
+    def memoryPeak():
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        for entry in Instrumentation.openStages():
+            entry[1] = max(entry[1], peak)
+        return peak
+
+    # A stage started in a worker thread is placed under parent, the path of the stage that
+    # started the thread
+    @contextlib.contextmanager
+    def stage(name, rowsIn=None, parent=None):
+        if not Instrumentation.enabled():
+            yield {}
+            return
+        tracing = Instrumentation.traceMemory and tracemalloc.is_tracing()
+        if tracing:
+            Instrumentation.memoryPeak()
+        stack = Instrumentation.openStages()
+        stack.append([name if parent is None or stack else parent + '/' + name, 0,
+                      tracemalloc.get_traced_memory()[0] if tracing else 0])
+        path = '/'.join(entry[0] for entry in stack)
+        profile = None
+        if Instrumentation.profileDir is not None and len(stack) == 1 and parent is None:
+            profile = cProfile.Profile()
+            profile.enable()
+        span = {'stage': path, 'rowsIn': rowsIn, 'pid': os.getpid(), 'start': time.time()}
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield span
+        except BaseException as error:
+            span['error'] = type(error).__name__
+            raise
+        finally:
+            span['wall'] = time.perf_counter() - wall
+            span['cpu'] = time.process_time() - cpu
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(os.path.join(Instrumentation.profileDir, path.replace('/', '.') + '.prof'))
+            if tracing:
+                Instrumentation.memoryPeak()
+                span['memoryPeak'] = stack[-1][1] - stack[-1][2]
+            stack.pop()
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            span['maxRss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+            for sink in Instrumentation.sinks:
+                sink(span)
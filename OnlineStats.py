@@ -0,0 +1,174 @@
+import math
+import numpy as np
+
+
+class QuantileSketch:
+    '''
+    Streaming quantile estimator with bounded memory (a KLL style sketch). Values go into a
+    buffer at level 0. When a level is full it is sorted and every other value is promoted to
+    the next level with twice the weight, so the sketch keeps O(k) values however many it
+    has seen. Up to k values everything is kept and quantiles are exact; beyond that the rank
+    error stays within a few percent of 1 / k. The choice between odd and even positions
+    alternates deterministically, so the same input always gives the same estimate.
+    '''
+    __slots__ = ('k', 'levels', 'size', 'count', 'flips', 'limit', 'limitLevels')
+
+    def __init__(self, k=200):
+        self.k = k
+        self.levels = [[]]
+        self.size = 0
+        self.count = 0
+        self.flips = 0
+        self.limitLevels = 0
+
+    # Capacity of a level, the lower levels get geometrically smaller buffers
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    # Capacity of all the levels, only recomputed when the number of levels changes
+    def maxSize(self):
+        if self.limitLevels != len(self.levels):
+            self.limitLevels = len(self.levels)
+            self.limit = sum(self.capacity(level) for level in range(self.limitLevels))
+        return self.limit
+
+    def update(self, value):
+        self.levels[0].append(value)
+        self.size += 1
+        self.count += 1
+        if self.size > self.maxSize():
+            self.compress()
+
+    # Compacting the lowest level that is over its capacity into the level above
+    def compress(self):
+        for level in range(len(self.levels)):
+            items = self.levels[level]
+            if len(items) >= self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                # An odd value out stays on its level with its current weight
+                keep = [items.pop()] if len(items) % 2 else []
+                offset = self.flips & 1
+                self.flips += 1
+                promoted = items[offset::2]
+                self.levels[level + 1].extend(promoted)
+                self.levels[level] = keep
+                self.size -= len(items) - len(promoted)
+                return
+
+    # Merging another sketch into this one. The levels are concatenated and compacted again, the
+    # result is a sketch of the union of both inputs with the same error guarantee.
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.size += other.size
+        self.count += other.count
+        while self.size > self.maxSize():
+            self.compress()
+        return self
+
+    # Building a sketch from a whole array at once. The values are sorted and halved until at most
+    # k are left, so it is exact for up to k values like update and has the same
+    # weights per level otherwise, without a Python loop over the values.
+    def fromArray(values, k=200):
+        sketch = QuantileSketch(k)
+        items = np.sort(np.asarray(values, dtype=np.float64))
+        sketch.count = len(items)
+        levels = []
+        while len(items) > k:
+            keep = items[len(items) - 1:] if len(items) % 2 else items[:0]
+            levels.append(keep.tolist())
+            items = items[:len(items) - len(keep)][sketch.flips & 1::2]
+            sketch.flips += 1
+        levels.append(items.tolist())
+        sketch.levels = levels
+        sketch.size = sum(len(items) for items in levels)
+        return sketch
+
+    def exact(self):
+        return len(self.levels) == 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return float('nan')
+        if self.exact():
+            return float(np.quantile(self.levels[0], q))
+        values = []
+        weights = []
+        for level, items in enumerate(self.levels):
+            values.extend(items)
+            weights.extend([1 << level] * len(items))
+        order = np.argsort(values, kind='stable')
+        values = np.asarray(values, dtype=np.float64)[order]
+        cumulative = np.cumsum(np.asarray(weights)[order])
+        rank = q * cumulative[-1]
+        return float(values[min(np.searchsorted(cumulative, rank), len(values) - 1)])
+
+    # Median with the same convention as np.median while the sketch is still exact
+    def median(self):
+        return self.quantile(0.5)
+
+
+class RunningStats:
+    '''
+    Online accumulator of the five statistics of Utils.stats_Calculator. Mean and standard
+    deviation are updated with Welford's algorithm, minimum and maximum directly, and the
+    median comes from a QuantileSketch. Nothing but the sketch grows with the number of points.
+    '''
+    __slots__ = ('count', 'mean', 'm2', 'minimum', 'maximum', 'sketch')
+
+    def __init__(self, k=200):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = float('inf')
+        self.maximum = float('-inf')
+        self.sketch = QuantileSketch(k)
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        self.sketch.update(value)
+
+    # Merging the statistics of another part of the same segment (Chan et al. for mean and m2)
+    def merge(self, other):
+        count = self.count + other.count
+        if other.count:
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta * delta * self.count * other.count / count
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+            self.count = count
+        self.sketch.merge(other.sketch)
+        return self
+
+    # Accumulator of a whole array of values, computed with NumPy instead of point by point
+    def fromArray(values, k=200):
+        values = np.asarray(values, dtype=np.float64)
+        stats = RunningStats(k)
+        stats.sketch = QuantileSketch.fromArray(values, k)
+        if len(values):
+            stats.count = len(values)
+            stats.mean = float(np.mean(values))
+            stats.m2 = float(np.sum(np.square(values - stats.mean)))
+            stats.minimum = float(np.min(values))
+            stats.maximum = float(np.max(values))
+        return stats
+
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else float('nan')
+
+    # [min, max, mean, median, std] like Utils.stats_Calculator
+    def result(self):
+        return [self.minimum, self.maximum, self.mean, self.sketch.median(), self.std()]
@@ -0,0 +1,94 @@
+from Utils import *
+from Preprocessing import *
+from OnlineStats import *
+
+
+class OnlineSubTrajectories:
+    '''
+    Point by point version of steps 1-3 for live feeds. Points of one stream are added in time
+    order (sorted by 't_user_id' and 'collected_time' like the batch input) and the 24 value
+    sub trajectory row of a segment is returned the moment the segment closes, i.e. when the
+    first pair of the next segment arrives. Only the running statistics of the open segment and
+    one pending pair are kept, never the points of a segment.
+    The rows match calculateSubTrajectories on the same points, except that medians of segments
+    longer than the sketch size k are estimates.
+    '''
+
+    def __init__(self, gapPolicy='wrap', minPoints=10, k=200):
+        self.gapPolicy = gapPolicy
+        self.minPoints = minPoints
+        self.k = k
+        self.excluded = [Utils.modeCode(mode) for mode in Utils.excludedModes]
+        self.previous = None
+        # The last valid pair, waiting for the speed of the next pair to get its acceleration
+        self.pending = None
+        self.segment = None
+        self.flag = 0
+        self.stats = None
+
+    # Distance, bearing and time of the pair from point a to point b, with the scalar versions of
+    # the batch kernels
+    def pairFeatures(self, a, b):
+        distance = Utils.haversineScalar(a[3], a[4], b[3], b[4])
+        bearing = Utils.bearingScalar(a[3], a[4], b[3], b[4])
+        return distance, Preprocessing.timeDelta(a[2], b[2], self.gapPolicy), bearing
+
+    def validPair(self, a, b):
+        if a[0] != b[0] or a[1] != b[1] or a[2] // 86400 != b[2] // 86400:
+            return False
+        return self.gapPolicy != 'drop' or b[2] > a[2]
+
+    def addPoint(self, userId, mode, epoch, latitude, longitude):
+        '''
+        Adding the next point of the stream. mode is the int8 code of Utils.modes, epoch the
+        timestamp in epoch seconds.
+        Return :- the sub trajectory rows closed by this point (an empty list or one row)
+        '''
+        point = (userId, mode, epoch, latitude, longitude)
+        previous, self.previous = self.previous, point
+        if previous is None or not self.validPair(previous, point):
+            return []
+        distance, time, bearing = self.pairFeatures(previous, point)
+        speed = distance / time if time != 0 else 0.0
+        key = (previous[0], previous[1], previous[2] // 86400)
+        closed = []
+        if self.pending is not None:
+            pendingKey, pendingDistance, pendingTime, pendingSpeed, pendingBearing = self.pending
+            sameSegment = pendingKey == key
+            acceleration = (speed - pendingSpeed) / pendingTime if (sameSegment and pendingTime != 0) else 0.0
+            self.updateSegment(pendingDistance, pendingSpeed, acceleration, pendingBearing)
+            if not sameSegment:
+                closed = self.closeSegment()
+        if self.segment != key:
+            self.openSegment(key)
+        self.pending = (key, distance, time, speed, bearing)
+        return closed
+
+    def openSegment(self, key):
+        self.flag += 1
+        self.segment = key
+        self.stats = [RunningStats(self.k) for _ in range(4)]
+
+    def updateSegment(self, distance, speed, acceleration, bearing):
+        for stats, value in zip(self.stats, (distance, speed, acceleration, bearing)):
+            stats.update(value)
+
+    def closeSegment(self):
+        stats, self.stats = self.stats, None
+        if stats is None or stats[0].count <= self.minPoints or self.segment[1] in self.excluded:
+            return []
+        row = list(self.segment) + [self.flag]
+        for accumulator in stats:
+            row += accumulator.result()
+        return [row]
+
+    # Closing the stream, the pending pair is the last of its segment so its acceleration is 0
+    def close(self):
+        if self.pending is None:
+            return []
+        _, distance, _, speed, bearing = self.pending
+        self.pending = None
+        self.updateSegment(distance, speed, 0.0, bearing)
+        closed = self.closeSegment()
+        self.segment = None
+        return closed
@@ -0,0 +1,153 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from Utils import *
+from Preprocessing import *
+from Segments import *
+from Featurization import *
+from Windows import *
+from SharedColumns import *
+
+
+class Parallel:
+    '''
+    Steps 2 and 3 on a process pool. Pairs and segments never cross users, so the tables are
+    cut into partitions of whole users, every partition is processed by a worker with the same
+    functions as the single process run and the results are concatenated in partition order.
+    Tables travel between the processes through SharedColumns, only descriptors are pickled.
+    The output is the same as the single process run, 'flag' included. Only the means and
+    standard deviations of windows can differ in the last bits, as their cumulative sums start
+    at the beginning of the partition instead of the table.
+    '''
+    # Partitions per worker, users differ a lot in size so a few more partitions balance the load
+    partitionsPerWorker = 4
+    # Rows every worker needs at least, below that starting the pool and copying the table to
+    # shared memory costs more than the worker saves
+    minRowsPerWorker = 250000
+
+    # Cores this process may run on, an explicit number of workers is capped at them
+    def workerCount(workers=None):
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+        return min(workers or cores, cores)
+
+    # Workers for a table of this many rows, 1 means the single process run
+    def poolSize(workers, rows):
+        return max(1, min(Parallel.workerCount(workers), rows // Parallel.minRowsPerWorker))
+
+    # Row ranges of about equal size, cut only where 't_user_id' changes
+    def userPartitions(userIds, partitions):
+        n = len(userIds)
+        if n == 0:
+            return []
+        userStarts = np.concatenate(([0], np.flatnonzero(userIds[1:] != userIds[:-1]) + 1))
+        targets = np.linspace(0, n, partitions + 1)[1:-1]
+        cuts = userStarts[np.minimum(np.searchsorted(userStarts, targets), len(userStarts) - 1)]
+        bounds = np.unique(np.concatenate(([0], cuts, [n])))
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def sliceTable(table, start, end):
+        return {name: column[start:end] for name, column in table.items()}
+
+    # Calling function with every tuple of arguments, on a pool when there is more than one worker.
+    # The results come back in the order of the arguments.
+    def map(function, arguments, workers):
+        if workers == 1 or len(arguments) < 2:
+            return [function(*argument) for argument in arguments]
+        with ProcessPoolExecutor(max_workers=min(workers, len(arguments))) as pool:
+            return list(pool.map(function, *zip(*arguments)))
+
+    # The point features of the rows start:end, written into their rows of the output table
+    def pointFeaturesPartition(inputs, start, end, starts, ends, features, precision, gapPolicy, output):
+        table = Parallel.sliceTable(SharedColumns.get(inputs), start, end)
+        values = Featurization.featureValues(table, features, precision, gapPolicy, starts, ends)
+        columns = SharedColumns.writable(output)
+        for name, column in values.items():
+            columns[name][start:end] = column
+            columns[name].flush()
+        return end - start
+
+    def pointFeatures(pointTable, features, precision='float64', gapPolicy='wrap', excludedModes=(), minPoints=None,
+                      workers=None):
+        '''
+        Featurization.pointFeatures on a process pool. The pairs are filtered and split into
+        segments here, and the segments that are dropped anyway are dropped before the table
+        is written to SharedColumns once. The workers compute the point features of their
+        partition and write them into feature columns allocated in the same directory, so the
+        result is that table memory-mapped and shared memory only ever holds one copy of it.
+        Param :- pointTable, features, precision, gapPolicy, excludedModes, minPoints, workers (all cores by default, see poolSize)
+        Return :- (point table with 'flag' and the feature columns added, (starts, ends) of the segments)
+        '''
+        workers = Parallel.poolSize(workers, len(pointTable['t_user_id']))
+        if workers == 1:
+            return Featurization.pointFeatures(pointTable, features, precision, gapPolicy, excludedModes, minPoints)
+        table = Preprocessing.filterTable(pointTable, Preprocessing.pairMask(pointTable, gapPolicy))
+        flag, starts, ends = Segments.split(table)
+        table, flag, starts, ends = Featurization.dropSegments(table, flag, starts, ends, excludedModes, minPoints)
+        table['flag'] = flag
+        ranges = Parallel.userPartitions(table['t_user_id'], workers * Parallel.partitionsPerWorker)
+        if len(ranges) < 2:
+            return dict(table, **Featurization.featureValues(table, features, precision, gapPolicy, starts,
+                                                             ends)), (starts, ends)
+        directory = SharedColumns.directory()
+        try:
+            inputs = SharedColumns.put(directory, 'points', table)
+            del table, flag
+            points = SharedColumns.get(inputs)
+            # The type of every feature, from the first segment
+            probe = Featurization.featureValues(Parallel.sliceTable(points, 0, ends[0]), features, precision,
+                                                gapPolicy, starts[:1], ends[:1])
+            output = SharedColumns.allocate(directory, 'features', {name: (column.dtype, len(points['flag']))
+                                                                    for name, column in probe.items()})
+            arguments = []
+            for start, end in ranges:
+                first, last = np.searchsorted(starts, [start, end])
+                arguments.append((inputs, start, end, starts[first:last] - start, ends[first:last] - start, features,
+                                  precision, gapPolicy, output))
+            Parallel.map(Parallel.pointFeaturesPartition, arguments, workers)
+            points.update(SharedColumns.get(output))
+        finally:
+            # The memory-mapped result stays readable, its memory is released with the last reference
+            SharedColumns.release(directory)
+        return points, (starts, ends)
+
+    # Featurization.subTrajectoryArrays, or Windows.subTrajectoryArrays with a window
+    def subTrajectoryArrays(points, segments, features, minPoints, excludedModes, window):
+        if window:
+            return Windows.subTrajectoryArrays(points, segments, features, window.get('size'), window.get('duration'),
+                                               window.get('stride'))
+        return Featurization.subTrajectoryArrays(points, segments, features, minPoints, excludedModes)
+
+    def subTrajectoriesPartition(inputs, start, end, segments, features, minPoints, excludedModes, window, output):
+        points = Parallel.sliceTable(SharedColumns.get(inputs), start, end)
+        keys, stats = Parallel.subTrajectoryArrays(points, segments, features, minPoints, excludedModes, window)
+        return SharedColumns.put(output[0], output[1], dict(keys, stats=stats))
+
+    def subTrajectories(points, segments, features, minPoints=None, excludedModes=None, window=None, workers=None):
+        '''
+        Featurization.subTrajectories (or Windows.subTrajectories when window has a 'size' or a
+        'duration' and optionally a 'stride') on a process pool. The points go to the workers and
+        the statistics come back through SharedColumns, the rows are only built at the end.
+        Param :- points, segments, features, minPoints, excludedModes, window, workers (all cores by default, see poolSize)
+        Return :- list of rows in the same order as the single process run
+        '''
+        workers = Parallel.poolSize(workers, len(points['t_user_id']))
+        starts, ends = segments
+        # Partitions of whole users with about the same number of segments
+        ranges = Parallel.userPartitions(points['t_user_id'][starts], workers * Parallel.partitionsPerWorker) \
+            if len(starts) else []
+        if len(ranges) < 2:
+            return Featurization.toRows(*Parallel.subTrajectoryArrays(points, segments, features, minPoints,
+                                                                      excludedModes, window))
+        directory = SharedColumns.directory()
+        try:
+            inputs = SharedColumns.put(directory, 'points', points)
+            arguments = []
+            for part, (first, last) in enumerate(ranges):
+                start, end = int(starts[first]), int(ends[last - 1])
+                arguments.append((inputs, start, end, (starts[first:last] - start, ends[first:last] - start),
+                                  features, minPoints, excludedModes, window, (directory, 'rows-{}'.format(part))))
+            outputs = Parallel.map(Parallel.subTrajectoriesPartition, arguments, workers)
+            result = SharedColumns.concat(directory, 'rows', outputs)
+            return Featurization.toRows(result, result['stats'])
+        finally:
+            SharedColumns.release(directory)
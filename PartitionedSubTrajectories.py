@@ -0,0 +1,65 @@
+import numpy as np
+from Utils import *
+from Segments import *
+from OnlineStats import *
+
+
+class PartitionedSubTrajectories:
+    '''
+    Aggregation of the sub trajectory features over partitions of the step 2 point table. A
+    partition can be any range of rows, also one that cuts a (user, mode, date) segment in
+    two. Every partition emits mergeable summaries per segment (count, mean, sum of squared
+    deviations, min, max and a QuantileSketch of every point feature, see RunningStats) and
+    the reducer merges the summaries of the same segment into the final feature row.
+    Segments are identified by their 'flag', which is global to the point table.
+    '''
+    keyColumns = ['t_user_id', 'transportation_mode', 'date_Start', 'flag']
+
+    def summarize(points, features, k=200):
+        '''
+        Summaries of one partition of the point table.
+        Param :- points (dict of columns, a row range of dataA1Soln), features, k
+        Return :- dict of flag -> (key row, list of RunningStats, one per feature)
+        '''
+        starts, ends = Segments.fromFlags(points['flag'])
+        keys = zip(*[np.asarray(points[name])[starts].tolist() for name in PartitionedSubTrajectories.keyColumns])
+        columns = [np.asarray(points[name]) for name in features]
+        summaries = {}
+        for key, start, end in zip(keys, starts, ends):
+            summaries[key[3]] = (list(key), [RunningStats.fromArray(column[start:end], k) for column in columns])
+        return summaries
+
+    # Merging the summaries of all the partitions, segment by segment
+    def merge(partitions):
+        merged = {}
+        for summaries in partitions:
+            for flag, (key, stats) in summaries.items():
+                if flag in merged:
+                    for total, part in zip(merged[flag][1], stats):
+                        total.merge(part)
+                else:
+                    merged[flag] = (key, stats)
+        return merged
+
+    def reduce(partitions, minPoints=10):
+        '''
+        Final sub trajectory rows from the summaries of all the partitions, in the order and
+        with the filters of calculateSubTrajectories (more than minPoints points, no excluded modes).
+        Param :- partitions (iterable of the results of summarize), minPoints
+        Return :- list of rows, the 4 key columns followed by 5 statistics per feature
+        '''
+        excluded = [Utils.modeCode(mode) for mode in Utils.excludedModes]
+        rows = []
+        for flag, (key, stats) in sorted(PartitionedSubTrajectories.merge(partitions).items()):
+            if stats[0].count <= minPoints or key[1] in excluded:
+                continue
+            rows.append(key + [value for accumulator in stats for value in accumulator.result()])
+        return rows
+
+    # Row ranges cutting the point table into the given number of partitions of about equal size
+    def partitionRanges(n, partitions):
+        bounds = np.linspace(0, n, partitions + 1).astype(np.int64)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def sliceTable(points, start, end):
+        return {name: column[start:end] for name, column in points.items()}
@@ -0,0 +1,100 @@
+import copy
+import os
+from Utils import *
+from Preprocessing import *
+from Ingestion import *
+from ExternalSort import *
+from FeatureRegistry import *
+from Featurization import *
+
+
+class Plan:
+    '''
+    Lazy plan of the steps 1-3 (reading, point features, sub trajectories) of one csv file.
+    Filters are declared on the plan and nothing is read before collect(). Each filter is then
+    applied at the earliest stage where it gives the same rows as filtering the finished sub
+    trajectories:-
+    users :- at ingestion, the other users are only split into segments to count them (and not
+    read beyond the last selected user), so the 'flag' of every row is the one of the full run
+    excluded modes, minimum points :- right after segmentation, before any point feature is
+    computed. Points of an excluded mode cannot be dropped while reading, their neighbours
+    would form pairs that do not exist in the full data.
+    Every filter method returns a new plan, so plans can be shared and extended.
+    '''
+    stages = ['read', 'pairs', 'segments', 'features', 'statistics']
+
+    def __init__(self, fileName, precision='float64', gapPolicy='wrap', extraPointFeatures=(), chunkSize=None):
+        self.fileName = fileName
+        self.precision = precision
+        self.gapPolicy = gapPolicy
+        self.pointFeatures = FeatureRegistry.withDefaults(extraPointFeatures)
+        self.chunkSize = chunkSize
+        self.userIds = None
+        self.excludedModes = list(Utils.excludedModes)
+        self.minimumPoints = Featurization.minPoints
+
+    def copyWith(self, **changes):
+        plan = copy.copy(self)
+        plan.__dict__.update(changes)
+        return plan
+
+    # Only the sub trajectories of these users
+    def users(self, userIds):
+        return self.copyWith(userIds=sorted(set(int(userId) for userId in userIds)))
+
+    # Replacing the modes whose sub trajectories are dropped (Utils.excludedModes by default)
+    def excludeModes(self, modes):
+        unknown = sorted(set(modes) - set(Utils.modes))
+        if unknown:
+            raise ValueError('Unknown transportation mode(s) {}'.format(unknown))
+        return self.copyWith(excludedModes=list(modes))
+
+    # Only sub trajectories with more than n pairs
+    def minPoints(self, n):
+        return self.copyWith(minimumPoints=n)
+
+    # The filters applied at every stage, as a list of (stage, description)
+    def explain(self):
+        filters = {stage: [] for stage in Plan.stages}
+        if self.userIds is not None:
+            filters['read'].append('t_user_id in {}'.format(self.userIds))
+        filters['pairs'].append('same user, mode and date, gap policy {}'.format(self.gapPolicy))
+        if self.excludedModes:
+            filters['segments'].append('transportation_mode not in {}'.format(self.excludedModes))
+        filters['segments'].append('more than {} points'.format(self.minimumPoints))
+        filters['features'].append(', '.join(self.pointFeatures))
+        return [(stage, '; '.join(filters[stage])) for stage in Plan.stages]
+
+    # The pairs of the selected users, and the segments of the other users before each of them
+    # (see Ingestion.selectUsers)
+    def readUsers(self):
+        sortedName = ExternalSort.ensureSorted(self.fileName, self.chunkSize or Ingestion.chunkSize)
+        try:
+            return Ingestion.selectUsers(sortedName, self.userIds, self.chunkSize, self.gapPolicy)
+        finally:
+            if sortedName != self.fileName:
+                os.remove(sortedName)
+
+    def read(self):
+        if self.chunkSize:
+            sortedName = ExternalSort.ensureSorted(self.fileName, self.chunkSize)
+            try:
+                return Ingestion.preProcess(sortedName, self.chunkSize, self.userIds)
+            finally:
+                if sortedName != self.fileName:
+                    os.remove(sortedName)
+        return Preprocessing.buildPairs(*Preprocessing.readPoints(self.fileName, self.userIds))
+
+    def collect(self):
+        '''
+        Running the plan.
+        Return :- list of sub trajectory rows like TrajectoryAnalytics.calculateSubTrajectories
+        '''
+        table, skipped = self.readUsers() if self.userIds is not None else (self.read(), {})
+        points, segments = Featurization.pointFeatures(table, self.pointFeatures, self.precision,
+                                                       self.gapPolicy, self.excludedModes, self.minimumPoints)
+        del table
+        keys, stats = Featurization.subTrajectoryArrays(points, segments, self.pointFeatures, self.minimumPoints,
+                                                        self.excludedModes)
+        keys['flag'] = Ingestion.offsetFlags(keys['flag'], keys['t_user_id'], skipped)
+        return Featurization.toRows(keys, stats)
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+
+class PointCache:
+    '''
+    On-disk cache of the output of steps 1-2 (the preprocessed points with distance, speed,
+    acceleration and bearing). Every column is stored as its own .npy file in a directory
+    named after the fingerprint of the input file and the pipeline parameters, so a later
+    run can memory-map the columns instead of parsing the csv again.
+    '''
+    # Bumped whenever the layout of the cached table changes, old entries are then never hit.
+    version = 1
+    blockSize = 1 << 20
+
+    # Hash of the content of the input file together with the parameters of the pipeline.
+    def fingerprint(fileName, parameters=None):
+        digest = hashlib.sha1()
+        with open(fileName, 'rb') as f:
+            for block in iter(lambda: f.read(PointCache.blockSize), b''):
+                digest.update(block)
+        digest.update(json.dumps({'version': PointCache.version, 'parameters': parameters or {}},
+                                 sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def entryPath(cacheDir, key):
+        return os.path.join(cacheDir, key)
+
+    # Writing the columns into a temporary directory first and renaming it afterwards, so a
+    # crashed run never leaves a half written entry behind.
+    def save(cacheDir, key, table):
+        os.makedirs(cacheDir, exist_ok=True)
+        path = PointCache.entryPath(cacheDir, key)
+        tmpPath = tempfile.mkdtemp(prefix=key + '.', dir=cacheDir)
+        try:
+            for name, column in table.items():
+                column = np.asarray(column)
+                # Strings are stored as fixed width unicode so the column can still be memory-mapped
+                if column.dtype == object:
+                    column = column.astype(str)
+                np.save(os.path.join(tmpPath, name + '.npy'), column, allow_pickle=False)
+            with open(os.path.join(tmpPath, 'columns.json'), 'w') as f:
+                json.dump(list(table), f)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.rename(tmpPath, path)
+        except BaseException:
+            shutil.rmtree(tmpPath, ignore_errors=True)
+            raise
+        return path
+
+    # Loading a cached table with every column memory-mapped read only, or None on a miss.
+    def load(cacheDir, key):
+        path = PointCache.entryPath(cacheDir, key)
+        manifest = os.path.join(path, 'columns.json')
+        if not os.path.isfile(manifest):
+            return None
+        with open(manifest) as f:
+            names = json.load(f)
+        return {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in names}
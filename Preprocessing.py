@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from Utils import *
+from Instrumentation import *
+
+
+class Preprocessing:
+    # Floating point type of the point features and sub trajectory statistics, 'float32' halves
+    # their size. The coordinates are always read as float64: float32 keeps about 7 digits, which
+    # rounds GPS positions to steps of about half a metre and ruins the distances and bearings of
+    # points a few metres apart.
+    precision = 'float64'
+    # Length of the 'YYYY-MM-DD HH:MM:SS' prefix of 'collected_time'. Anything after it
+    # (the '-07' style offset) was thrown away by the old string splitting as well.
+    timestampLength = 19
+
+    # Parsing 'collected_time' once for the whole column. The strings are truncated to the
+    # timestamp prefix and handed to NumPy as datetime64[s], which gives us int64 epoch seconds
+    # without going through Python datetime objects.
+    def parseTimestamps(collectedTime):
+        stamps = np.asarray(collectedTime, dtype='U' + str(Preprocessing.timestampLength))
+        return stamps.astype('datetime64[s]').astype(np.int64)
+
+    # Splitting epoch seconds into the day number (days since 1970-01-01) and the seconds
+    # elapsed in that day. These replace the 'date' and 'time' strings of the old preprocessing.
+    def splitEpoch(epoch):
+        day = epoch // 86400
+        return day.astype(np.int32), (epoch - day * 86400).astype(np.int32)
+
+    # Dtypes for pd.read_csv. The mode is read straight into a categorical, so the strings
+    # are turned into small integer codes while parsing.
+    def inputDtypes():
+        return {'t_user_id': np.int32, 'latitude': np.float64, 'longitude': np.float64,
+                'transportation_mode': 'category'}
+
+    # int8 codes of the transportation modes, i.e. their index in Utils.modes. The codes have to
+    # mean the same in every chunk and every run, so modes missing from Utils.modes are rejected.
+    def encodeModes(modes):
+        modes = pd.Categorical(modes)
+        unknown = sorted(set(modes.categories) - set(Utils.modes))
+        if unknown:
+            raise ValueError('Unknown transportation mode(s) {}, add them to Utils.modes'.format(unknown))
+        return modes.set_categories(Utils.modes).codes.astype(np.int8)
+
+    # Sorting the points in ascending order of 't_user_id' and time. np.lexsort is stable,
+    # so points with the same user and timestamp keep their order from the file.
+    def sortPoints(userIds, epoch):
+        return np.lexsort((epoch, userIds))
+
+    # Building the start/end pairs of consecutive points. Start columns are the arrays
+    # without their last element and end columns are the arrays shifted by one, both are
+    # views so no data is copied here.
+    def buildPairs(userIds, modes, epoch, latitude, longitude):
+        day, seconds = Preprocessing.splitEpoch(epoch)
+        return {'t_user_id': userIds[:-1],
+                'transportation_mode': modes[:-1],
+                'date_Start': day[:-1],
+                'time_Start': seconds[:-1],
+                'latitude_Start': latitude[:-1],
+                'longitude_Start': longitude[:-1],
+                'latitude_End': latitude[1:],
+                'longitude_End': longitude[1:],
+                'date_End': day[1:],
+                'time_End': seconds[1:],
+                'UserChk': userIds[1:],
+                'ModeChk': modes[1:]}
+
+    # Reading the points of the csv file sorted by 't_user_id' and time, as the column arrays
+    # (user ids, mode codes, epoch seconds, latitude, longitude). With users only the points of
+    # those users are kept, the others are dropped before their timestamps are parsed.
+    def readPoints(fileName, users=None):
+        with Instrumentation.stage('readCsv') as span:
+            df = pd.read_csv(fileName, usecols=['t_user_id', 'collected_time', 'latitude', 'longitude',
+                                                'transportation_mode'],
+                             dtype=Preprocessing.inputDtypes())
+            if users is not None:
+                df = df[df['t_user_id'].isin(users)]
+            span['rowsOut'] = len(df)
+        with Instrumentation.stage('parseTimestamps', len(df)):
+            epoch = Preprocessing.parseTimestamps(df['collected_time'].values)
+        with Instrumentation.stage('sortPoints', len(df)):
+            order = Preprocessing.sortPoints(df['t_user_id'].values, epoch)
+        return (df['t_user_id'].values[order],
+                Preprocessing.encodeModes(df['transportation_mode'])[order],
+                epoch[order],
+                df['latitude'].values[order],
+                df['longitude'].values[order])
+
+    def preProcess(fileName):
+        '''
+        Reading the csv file and turning it into a table of typed column arrays, one
+        row per pair of consecutive points sorted by 't_user_id' and 'collected_time'.
+        The columns are the ones listed in Utils.pointColumns, stored compactly: int32 user
+        ids, int8 mode codes (see Utils.modes), int32 day numbers for 'date_*', int32 seconds
+        of the day for 'time_*' and float64 coordinates.
+        Param :- fileName
+        Return :- dict of column name -> numpy array
+        '''
+        points = Preprocessing.readPoints(fileName)
+        with Instrumentation.stage('buildPairs', len(points[0])):
+            return Preprocessing.buildPairs(*points)
+
+    # How pairs whose end point is not later than their start point are handled:-
+    # 'wrap' :- negative gaps wrap around the day like the old timedelta.seconds did, zero gaps
+    #           give a speed and acceleration of 0
+    # 'zero' :- negative gaps are treated as zero gaps
+    # 'drop' :- pairs with a zero or negative gap are removed by pairMask
+    gapPolicies = ['wrap', 'zero', 'drop']
+
+    # Time between the start and the end point of every pair in whole seconds, computed by
+    # subtracting the integer day and second columns.
+    def timeDeltas(table, gapPolicy='wrap'):
+        if gapPolicy not in Preprocessing.gapPolicies:
+            raise ValueError('Unknown gap policy {}, expected one of {}'.format(gapPolicy, Preprocessing.gapPolicies))
+        delta = (table['date_End'].astype(np.int64) - table['date_Start']) * 86400
+        delta += table['time_End']
+        delta -= table['time_Start']
+        if gapPolicy == 'wrap':
+            delta %= 86400
+        elif gapPolicy == 'zero':
+            np.maximum(delta, 0, out=delta)
+        return delta
+
+    # timeDeltas of a single pair from the epoch seconds of its start and end point
+    def timeDelta(startEpoch, endEpoch, gapPolicy='wrap'):
+        if gapPolicy not in Preprocessing.gapPolicies:
+            raise ValueError('Unknown gap policy {}, expected one of {}'.format(gapPolicy, Preprocessing.gapPolicies))
+        delta = endEpoch - startEpoch
+        if gapPolicy == 'wrap':
+            return delta % 86400
+        if gapPolicy == 'zero':
+            return max(delta, 0)
+        return delta
+
+    # Keeping only the pairs whose start and end point belong to the same user,
+    # transportation mode and date, and with the 'drop' gap policy only pairs that move forward in time.
+    def pairMask(table, gapPolicy='wrap'):
+        mask = ((table['t_user_id'] == table['UserChk'])
+                & (table['transportation_mode'] == table['ModeChk'])
+                & (table['date_Start'] == table['date_End']))
+        if gapPolicy == 'drop':
+            mask &= Preprocessing.timeDeltas(table, gapPolicy) > 0
+        return mask
+
+    def filterTable(table, mask):
+        return {name: column[mask] for name, column in table.items()}
@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import numpy as np
+from Instrumentation import *
+from Benchmark import *
+
+
+class Regression:
+    '''
+    Regression gate of steps 1 to 3:-
+    python Regression.py                      (exit status 1 when a check fails)
+    Every fixture is a synthetic csv (see Synthetic, generated again from its seed rather than
+    stored). Its sub trajectory rows, the 4 key columns and the 20 statistics, are compared to
+    the golden values in regression/<fixture>.npz, which were recorded with the original list
+    based calculatePointFeatures and calculateSubTrajectories: the keys have to be equal and the
+    statistics equal within the tolerances. The best of a few runs of every stage is compared to
+    its time in regression/baselines.json and a stage more than threshold times slower fails.
+    Timings only compare on the same machine, --update-baselines records them again there.
+    '''
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regression')
+    # name :- (points, seed) of the synthetic csv
+    fixtures = {'small': (20000, 1), 'medium': (200000, 2)}
+    stages = ['preProcessing', 'calculatePointFeatures', 'calculateSubTrajectories']
+    # A statistic matches when it is within rtol of the golden value or within atol times the largest
+    # golden value of its column, as the values close to 0 (mean accelerations) are sums that cancel
+    rtol = 1e-6
+    atol = 1e-7
+    threshold = 1.25
+    # Seconds a stage may always be slower by, so the shortest stages do not fail on noise
+    slack = 0.005
+
+    def digest(fileName):
+        digest = hashlib.sha1()
+        with open(fileName, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def runStages(fileName, chunkSize=None, workers=1):
+        '''
+        Steps 1 to 3 on fileName like TrajectoryAnalytics runs them.
+        Param :- fileName, chunkSize, workers
+        Return :- (sub trajectory rows as a dict of 'keys' and 'stats', dict of stage -> seconds)
+        '''
+        from Utils import Utils
+        from Preprocessing import Preprocessing
+        from Ingestion import Ingestion
+        from FeatureRegistry import FeatureRegistry
+        from Featurization import Featurization
+        from Parallel import Parallel
+        from Checkpoints import Checkpoints
+        records = []
+        Instrumentation.enable(records.append)
+        features = FeatureRegistry.defaults
+        try:
+            with Instrumentation.stage('preProcessing'):
+                table = Ingestion.preProcess(fileName, chunkSize) if chunkSize else Preprocessing.preProcess(fileName)
+            with Instrumentation.stage('calculatePointFeatures'):
+                if workers == 1:
+                    points, segments = Featurization.pointFeatures(table, features, 'float64', 'wrap',
+                                                                   Utils.excludedModes, Featurization.minPoints)
+                else:
+                    points, segments = Parallel.pointFeatures(table, features, 'float64', 'wrap',
+                                                              Utils.excludedModes, Featurization.minPoints, workers)
+            with Instrumentation.stage('calculateSubTrajectories'):
+                if workers == 1:
+                    rows = Featurization.subTrajectories(points, segments, features)
+                else:
+                    rows = Parallel.subTrajectories(points, segments, features, workers=workers)
+        finally:
+            Instrumentation.disable()
+        return Checkpoints.rowsTable(rows), {record['stage']: record['wall'] for record in records
+                                             if record['stage'] in Regression.stages}
+
+    def goldenFile(fixture):
+        return os.path.join(Regression.directory, fixture + '.npz')
+
+    def loadGolden(fixture):
+        with np.load(Regression.goldenFile(fixture), allow_pickle=False) as golden:
+            return {name: golden[name] for name in golden.files}
+
+    def saveGolden(fixture, table, digest):
+        os.makedirs(Regression.directory, exist_ok=True)
+        with open(Regression.goldenFile(fixture), 'wb') as f:
+            np.savez_compressed(f, keys=table['keys'], stats=table['stats'], digest=np.array(digest))
+
+    # Differences between the rows of a run and the golden ones, an empty list when they match
+    def compare(table, golden):
+        if table['keys'].shape != golden['keys'].shape or table['stats'].shape != golden['stats'].shape:
+            return ['{} sub trajectories with {} statistics instead of {} with {}'.format(
+                len(table['keys']), table['stats'].shape[1], len(golden['keys']), golden['stats'].shape[1])]
+        problems = []
+        rows = np.flatnonzero((table['keys'] != golden['keys']).any(axis=1))
+        if len(rows):
+            problems.append('keys differ in {} rows, first row {}: {} instead of {}'.format(
+                len(rows), rows[0], table['keys'][rows[0]].tolist(), golden['keys'][rows[0]].tolist()))
+        scale = np.nanmax(np.abs(golden['stats']), axis=0, initial=0.0)
+        close = np.abs(table['stats'] - golden['stats']) <= Regression.rtol * np.abs(golden['stats']) + \
+            Regression.atol * scale
+        close |= np.isnan(table['stats']) & np.isnan(golden['stats'])
+        if not close.all():
+            row, column = np.argwhere(~close)[0]
+            problems.append('statistics differ in {} values, first in row {} column {}: {!r} instead of {!r}'.format(
+                (~close).sum(), row, column + 4, table['stats'][row, column], golden['stats'][row, column]))
+        return problems
+
+    def loadBaselines():
+        fileName = os.path.join(Regression.directory, 'baselines.json')
+        if not os.path.exists(fileName):
+            return {}
+        with open(fileName) as f:
+            return json.load(f)
+
+    def saveBaselines(baselines):
+        os.makedirs(Regression.directory, exist_ok=True)
+        with open(os.path.join(Regression.directory, 'baselines.json'), 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    def check(fixtures, dataDir, repeats=3, threshold=None, chunkSize=None, workers=1, updateGolden=False,
+              updateBaselines=False):
+        '''
+        Running the gate and printing a line per check.
+        Param :- fixtures (names of Regression.fixtures), dataDir of the csv files, repeats of every
+        stage, threshold, chunkSize, workers, updateGolden / updateBaselines to record instead of compare
+        Return :- list of the failures
+        '''
+        threshold = threshold or Regression.threshold
+        baselines = Regression.loadBaselines()
+        failures = []
+        for fixture in fixtures:
+            points, seed = Regression.fixtures[fixture]
+            # The golden values were recorded on data with every mode of Synthetic.profiles
+            fileName = Benchmark.dataFile(dataDir, points, seed, allModes=True)
+            digest = Regression.digest(fileName)
+            runs = [Regression.runStages(fileName, chunkSize, workers) for _ in range(repeats)]
+            table = runs[0][0]
+            timings = {stage: min(run[1][stage] for run in runs) for stage in Regression.stages}
+
+            if updateGolden:
+                Regression.saveGolden(fixture, table, digest)
+                print('{}: golden values of {} sub trajectories recorded'.format(fixture, len(table['keys'])))
+            elif not os.path.exists(Regression.goldenFile(fixture)):
+                failures.append('{}: no golden values, run with --update-golden'.format(fixture))
+            else:
+                golden = Regression.loadGolden(fixture)
+                if str(golden['digest']) != digest:
+                    problems = ['the fixture csv is not the one the golden values were recorded on']
+                else:
+                    problems = Regression.compare(table, golden)
+                failures += ['{}: {}'.format(fixture, problem) for problem in problems]
+                print('{}: {} sub trajectories {}'.format(fixture, len(table['keys']),
+                                                          'differ' if problems else 'match the golden values'))
+
+            # Streaming and the process pool have baselines of their own
+            key = fixture + (' chunkSize={}'.format(chunkSize) if chunkSize else '') + \
+                (' workers={}'.format(workers) if workers != 1 else '')
+            if updateBaselines:
+                baselines[key] = timings
+                continue
+            for stage in Regression.stages:
+                baseline = baselines.get(key, {}).get(stage)
+                if baseline is None:
+                    print('{}: {:<26} {:>8.4f} s, no baseline'.format(fixture, stage, timings[stage]))
+                    continue
+                slow = timings[stage] > baseline * threshold + Regression.slack
+                print('{}: {:<26} {:>8.4f} s, baseline {:.4f} s ({:+.0%}){}'.format(
+                    fixture, stage, timings[stage], baseline, timings[stage] / baseline - 1, ' SLOWER' if slow else ''))
+                if slow:
+                    failures.append('{}: {} took {:.4f} s, more than {} times the baseline of {:.4f} s'.format(
+                        fixture, stage, timings[stage], threshold, baseline))
+        if updateBaselines:
+            Regression.saveBaselines(baselines)
+        return failures
+
+    def main(argv=None):
+        parser = argparse.ArgumentParser(prog='Regression.py', description='Regression gate of steps 1 to 3')
+        parser.add_argument('--fixtures', nargs='+', default=sorted(Regression.fixtures),
+                            choices=sorted(Regression.fixtures))
+        parser.add_argument('--data-dir', default=tempfile.gettempdir(), help='where the fixture csv files are kept')
+        parser.add_argument('--repeats', type=int, default=3, help='runs per fixture, the fastest one counts')
+        parser.add_argument('--threshold', type=float, default=Regression.threshold,
+                            help='how many times slower than the baseline a stage may be')
+        parser.add_argument('--chunk-size', type=int, default=None, help='check the streaming ingestion')
+        parser.add_argument('--workers', type=int, default=1, help='check the process pool')
+        parser.add_argument('--update-golden', action='store_true', help='record the golden values again')
+        parser.add_argument('--update-baselines', action='store_true', help='record the baseline timings again')
+        args = parser.parse_args(argv)
+        failures = Regression.check(args.fixtures, args.data_dir, args.repeats, args.threshold, args.chunk_size,
+                                    args.workers, args.update_golden, args.update_baselines)
+        for failure in failures:
+            print('FAILED ' + failure)
+        return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(Regression.main(sys.argv[1:]))
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+class SegmentStats:
+    '''
+    Segmented statistics. Given a (n, k) array of point features and the offsets of the
+    segments (segment s covers the rows starts[s]:ends[s]), the minimum, maximum, mean,
+    median and standard deviation of every feature over every segment are computed with a
+    handful of array operations instead of one Utils.stats_Calculator call per segment.
+    '''
+    statistics = ['min', 'max', 'mean', 'median', 'std']
+
+    # Gathering the rows of the segments into one contiguous block, so segment s becomes the
+    # rows offsets[s]:offsets[s + 1]. Segments that already are back to back are not copied.
+    def contiguous(values, starts, ends):
+        counts = ends - starts
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        if len(starts) and np.array_equal(starts[1:], ends[:-1]):
+            return values[starts[0]:ends[-1]], offsets, counts
+        index = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+        return values[index], offsets, counts
+
+    # Median of every column within every segment. Sorting by (segment, value) puts the
+    # values of each segment in order, the median is then read off at the middle position(s).
+    def medians(values, offsets, counts):
+        segmentIds = np.repeat(np.arange(len(counts)), counts)
+        lower = offsets[:-1] + (counts - 1) // 2
+        upper = offsets[:-1] + counts // 2
+        result = np.empty((len(counts), values.shape[1]))
+        for column in range(values.shape[1]):
+            ordered = values[np.lexsort((values[:, column], segmentIds)), column]
+            result[:, column] = (ordered[lower] + ordered[upper]) / 2
+        return result
+
+    def compute(values, starts, ends):
+        '''
+        Statistics of every feature column over every segment. All the segments have to be
+        non empty and in ascending order.
+        Param :- values (n, k), starts, ends
+        Return :- (segments, 5 * k) matrix with min, max, mean, median, std of feature 0,
+        then of feature 1 and so on, the column layout of Utils.columns[4:]
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        block, offsets, counts = SegmentStats.contiguous(values, starts, ends)
+        result = np.empty((len(counts), 5, values.shape[1]))
+        if len(counts) == 0:
+            return result.reshape(0, 5 * values.shape[1])
+        first = offsets[:-1]
+        result[:, 0] = np.minimum.reduceat(block, first, axis=0)
+        result[:, 1] = np.maximum.reduceat(block, first, axis=0)
+        mean = np.add.reduceat(block, first, axis=0) / counts[:, None]
+        result[:, 2] = mean
+        result[:, 3] = SegmentStats.medians(block, offsets, counts)
+        # Population standard deviation from the deviations around the segment means, like np.std
+        deviations = block - np.repeat(mean, counts, axis=0)
+        deviations *= deviations
+        result[:, 4] = np.sqrt(np.add.reduceat(deviations, first, axis=0) / counts[:, None])
+        return result.transpose(0, 2, 1).reshape(len(counts), 5 * values.shape[1])
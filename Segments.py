@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class Segments:
+    '''
+    Sub trajectories are the runs of consecutive pairs with the same 't_user_id',
+    'transportation_mode' and 'date_Start'. They are found once with a vectorized change point
+    pass and described by offsets: segment k covers the rows starts[k]:ends[k].
+    '''
+
+    # Offsets of the runs of equal values over the given key columns
+    def boundaries(*keys):
+        n = len(keys[0])
+        if n == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        change = np.zeros(n - 1, dtype=bool)
+        for key in keys:
+            change |= key[1:] != key[:-1]
+        starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+        ends = np.concatenate((starts[1:], [n]))
+        return starts, ends
+
+    # The 'flag' column, numbering the segments 1, 2, 3, ... row by row
+    def segmentIds(starts, n):
+        ids = np.zeros(n, dtype=np.int32)
+        ids[starts[1:]] = 1
+        np.cumsum(ids, out=ids)
+        ids += 1
+        return ids
+
+    # Segment ids and offsets of a filtered point table
+    def split(table):
+        starts, ends = Segments.boundaries(table['t_user_id'], table['transportation_mode'], table['date_Start'])
+        return Segments.segmentIds(starts, len(table['t_user_id'])), starts, ends
+
+    # Offsets of the segments of an existing 'flag' column, e.g. of a cached point table
+    def fromFlags(flag):
+        return Segments.boundaries(np.asarray(flag))
+
+
+    # True on the last row of every segment
+    def lastRowMask(ends, n):
+        mask = np.zeros(n, dtype=bool)
+        mask[ends - 1] = True
+        return mask
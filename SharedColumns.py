@@ -0,0 +1,83 @@
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from PointCache import *
+
+
+class SharedColumns:
+    '''
+    Handing column tables between processes without pickling them. A table is written once as
+    a PointCache entry (one .npy file per column) into a directory on /dev/shm when there is
+    one, so the files live in shared memory, and only the descriptor (directory, key) is sent
+    to the other process, which memory-maps the columns. Slicing a memory-mapped column
+    copies nothing, so a worker only touches the rows of its own partition.
+    '''
+    root = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    # Directories not released yet, the ones left are removed at exit
+    directories = set()
+    cleanupRegistered = False
+
+    # A fresh directory for the tables of one parallel run, removed by release or at exit
+    def directory():
+        if not SharedColumns.cleanupRegistered:
+            atexit.register(SharedColumns.releaseAll)
+            SharedColumns.cleanupRegistered = True
+        path = tempfile.mkdtemp(prefix='trajectory-', dir=SharedColumns.root)
+        SharedColumns.directories.add(path)
+        return path
+
+    # Removing a directory and its tables. Columns that are still memory-mapped stay readable,
+    # the memory is released once the last of them is gone.
+    def release(path):
+        SharedColumns.directories.discard(path)
+        shutil.rmtree(path, ignore_errors=True)
+
+    def releaseAll():
+        for path in list(SharedColumns.directories):
+            SharedColumns.release(path)
+
+    def put(directory, key, table):
+        PointCache.save(directory, key, table)
+        return directory, key
+
+    def get(descriptor):
+        return PointCache.load(*descriptor)
+
+    # An empty table of the given columns (name -> (dtype, rows)) for other processes to fill in
+    # place through writable, so their results go straight into shared memory
+    def allocate(directory, key, columns):
+        path = PointCache.entryPath(directory, key)
+        os.makedirs(path)
+        for name, (dtype, rows) in columns.items():
+            np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode='w+', dtype=dtype, shape=(rows,))
+        with open(os.path.join(path, 'columns.json'), 'w') as f:
+            json.dump(list(columns), f)
+        return directory, key
+
+    # The columns of a table memory-mapped for writing
+    def writable(descriptor):
+        path = PointCache.entryPath(*descriptor)
+        with open(os.path.join(path, 'columns.json')) as f:
+            names = json.load(f)
+        return {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r+') for name in names}
+
+    # Writing the tables of the descriptors one after the other into a new table of the same
+    # layout, column by column, and returning it memory-mapped
+    def concat(directory, key, descriptors):
+        parts = [SharedColumns.get(descriptor) for descriptor in descriptors]
+        path = tempfile.mkdtemp(prefix=key + '.', dir=directory)
+        for name in parts[0]:
+            columns = [part[name] for part in parts]
+            shape = (sum(len(column) for column in columns),) + columns[0].shape[1:]
+            out = np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode='w+',
+                                            dtype=columns[0].dtype, shape=shape)
+            np.concatenate(columns, out=out)
+            out.flush()
+            del out
+        with open(os.path.join(path, 'columns.json'), 'w') as f:
+            json.dump(list(parts[0]), f)
+        os.rename(path, PointCache.entryPath(directory, key))
+        return SharedColumns.get((directory, key))
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+
+class Synthetic:
+    '''
+    Synthetic GPS trajectories in the schema of geolife_raw.csv ('t_user_id', 'collected_time',
+    'latitude', 'longitude', 'transportation_mode'), for benchmarks and tests without the real
+    data. Every user travels around Beijing in segments of one mode. Within a segment the points
+    come every few seconds like in GeoLife, the speed follows the profile of the mode (mean speed,
+    spread, how often it stops) and the heading wanders as much as the mode allows. Segments are
+    separated by a pause, sometimes by a night. Users are written one after the other in blocks
+    of at most blockSize points, so the memory used does not grow with the number of points.
+    Only the modes of classifiedModes are generated by default, so the data runs through
+    TrajectoryAnalytics end to end. With allModes every mode of profiles is.
+    '''
+    # mode :- (share of the segments, mean speed in m/s, spread of the log speed, probability of
+    # standing still at a point, standard deviation of the heading change per point in radians)
+    profiles = {'walk': (0.30, 1.3, 0.35, 0.05, 0.30),
+                'bus': (0.18, 6.5, 0.50, 0.15, 0.10),
+                'bike': (0.14, 4.0, 0.35, 0.03, 0.15),
+                'car': (0.10, 10.0, 0.50, 0.08, 0.06),
+                'subway': (0.08, 12.0, 0.40, 0.05, 0.04),
+                'train': (0.06, 20.0, 0.30, 0.02, 0.02),
+                'taxi': (0.07, 9.0, 0.50, 0.08, 0.06),
+                'motorcycle': (0.02, 9.0, 0.45, 0.05, 0.08),
+                'run': (0.02, 2.8, 0.25, 0.02, 0.25),
+                'boat': (0.02, 5.0, 0.30, 0.02, 0.05),
+                'airplane': (0.01, 180.0, 0.20, 0.00, 0.01)}
+    # The six modes of the classifier hierarchy
+    classifiedModes = ['walk', 'bus', 'car', 'subway', 'train', 'taxi']
+    # Seconds between two points and how often they occur
+    intervals = [1, 2, 3, 5, 10]
+    intervalShares = [0.45, 0.20, 0.10, 0.20, 0.05]
+    # Points per segment are log-normal with this median
+    segmentMedian = 150
+    blockSize = 1000000
+    metresPerDegree = 111320.0
+    start = np.datetime64('2008-04-01T00:00:00').astype(np.int64)
+
+    # Points of every user, log-normal like the very unequal users of GeoLife, summing to points
+    def userCounts(rng, points, users):
+        weights = rng.lognormal(0.0, 1.0, users)
+        counts = np.floor(points * weights / weights.sum()).astype(np.int64)
+        counts[np.argsort(-weights)[:points - counts.sum()]] += 1
+        return counts
+
+    def segmentLengths(rng, count):
+        lengths = np.maximum(2, rng.lognormal(np.log(Synthetic.segmentMedian), 1.0,
+                                              count // Synthetic.segmentMedian + 8).astype(np.int64))
+        while lengths.sum() < count:
+            lengths = np.concatenate((lengths, lengths))
+        ends = np.cumsum(lengths)
+        last = np.searchsorted(ends, count)
+        lengths = lengths[:last + 1]
+        lengths[-1] -= ends[last] - count
+        return lengths[lengths > 0]
+
+    def modes(allModes=False):
+        return [name for name in Synthetic.profiles if allModes or name in Synthetic.classifiedModes]
+
+    def block(rng, user, count, state, allModes=False):
+        '''
+        count points of one user, carrying on from state.
+        Param :- rng, user, count, state (epoch seconds, latitude, longitude of the last point), allModes
+        Return :- (DataFrame of the points, state after the last point)
+        '''
+        names = Synthetic.modes(allModes)
+        profiles = np.array([Synthetic.profiles[name] for name in names])
+        lengths = Synthetic.segmentLengths(rng, count)
+        firsts = np.cumsum(lengths) - lengths
+        mode = np.repeat(rng.choice(len(names), len(lengths), p=profiles[:, 0] / profiles[:, 0].sum()), lengths)
+
+        # Between segments a pause of up to 20 minutes, or up to 14 hours a third of the time
+        dt = rng.choice(Synthetic.intervals, count, p=Synthetic.intervalShares).astype(np.int64)
+        pauses = rng.integers(60, 1200, len(lengths))
+        overnight = rng.random(len(lengths)) < 1 / 3
+        pauses[overnight] = rng.integers(3600, 14 * 3600, overnight.sum())
+        dt[firsts] = pauses
+        epoch = state[0] + np.cumsum(dt)
+
+        speed = profiles[mode, 1] * rng.lognormal(0.0, 1.0, count) ** profiles[mode, 2]
+        speed[rng.random(count) < profiles[mode, 3]] = 0.0
+        step = speed * dt
+        step[firsts] = 0.0
+        heading = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0.0, 1.0, count) * profiles[mode, 4])
+        latitude = state[1] + np.cumsum(step * np.cos(heading)) / Synthetic.metresPerDegree
+        longitude = state[2] + np.cumsum(step * np.sin(heading)) / (Synthetic.metresPerDegree
+                                                                    * np.cos(np.radians(state[1])))
+
+        frame = pd.DataFrame({'t_user_id': np.full(count, user, dtype=np.int32),
+                              'collected_time': Synthetic.timestamps(epoch),
+                              'latitude': latitude, 'longitude': longitude,
+                              'transportation_mode': np.asarray(names)[mode]})
+        return frame, (epoch[-1], latitude[-1], longitude[-1])
+
+    # 'YYYY-MM-DD HH:MM:SS-07' strings of epoch seconds, written character by character into
+    # a fixed width array instead of formatting every timestamp on its own
+    def timestamps(epoch):
+        stamps = np.datetime_as_string(epoch.astype('datetime64[s]'))
+        chars = np.empty((len(epoch), 22), dtype='U1')
+        chars[:, :19] = stamps.astype('U19').view('U1').reshape(-1, 19)
+        chars[:, 10] = ' '
+        chars[:, 19:] = ['-', '0', '7']
+        return chars.view('U22').ravel()
+
+    def generate(fileName, points, users=None, seed=0, allModes=False):
+        '''
+        Writing a csv of synthetic points, sorted by 't_user_id' and 'collected_time'.
+        Param :- fileName, points, users (by default one per 10000 points, between 10 and the
+        182 of GeoLife), seed, allModes (also the modes outside classifiedModes)
+        Return :- number of points written
+        '''
+        users = users or int(min(182, max(10, points // 10000)))
+        rng = np.random.default_rng(seed)
+        counts = Synthetic.userCounts(rng, points, users)
+        header = True
+        with open(fileName, 'w') as f:
+            for user, count in enumerate(counts.tolist(), 1):
+                state = (Synthetic.start + int(rng.integers(0, 30)) * 86400 + 6 * 3600,
+                         39.9 + rng.normal(0.0, 0.1), 116.4 + rng.normal(0.0, 0.1))
+                for offset in range(0, count, Synthetic.blockSize):
+                    frame, state = Synthetic.block(rng, user, min(Synthetic.blockSize, count - offset), state,
+                                                   allModes)
+                    frame.to_csv(f, header=header, index=False, float_format='%.6f')
+                    header = False
+        return int(counts.sum())
@@ -6,155 +6,156 @@ from operator import mul
 import itertools
 from sklearn.metrics import accuracy_score
 from sklearn.metrics import classification_report
-from haversine import haversine
 from datetime import datetime
 import math
+import os
 import matplotlib.pyplot as plt
 from Utils import *
 from Classifiers import *
 from Evaluation import *
 from scipy.stats import ttest_ind, ttest_ind_from_stats
 from Plotter import *
+from Preprocessing import *
+from Ingestion import *
+from ExternalSort import *
+from PointCache import *
+from Segments import *
+from SegmentStats import *
+from FeatureRegistry import *
+from Featurization import *
+from Windows import *
+from Parallel import *
+from Checkpoints import *
+from Instrumentation import *
 
 class TrajectoryAnalytics:
-    def __init__(self, fileName):
-        self.dataList = self.preProcessing(fileName)
-        print("Step 1 successful")
-        self.dataAll = self.calculatePointFeatures()
-        print("Step 2 successful")
-        self.dataAllMeasures = self.calculateSubTrajectories()
-        print("Step 3 successful")
-        self.similarTransportationModes()  # This is just for plotting the data
-        print("Step 4 successful")
-        self.dataSubTrajectories = pd.DataFrame(self.dataAllMeasures, columns= Utils.columns)
+    # The stages of the pipeline in the order they run, see Checkpoints
+    stages = ['preProcessing', 'pointFeatures', 'subTrajectories', 'similarities', 'classify', 'evaluate']
+
+    def __init__(self, fileName, chunkSize=None, cacheDir=None, precision='float64', gapPolicy='wrap',
+                 extraPointFeatures=(), windowSize=None, windowDuration=None, windowStride=None, workers=1,
+                 fromStage=None):
+        '''
+        Running the six steps on fileName. With a cacheDir every stage keeps its output there as a
+        checkpoint (see Checkpoints): stages whose input and parameters have not changed are
+        skipped, and fromStage (one of TrajectoryAnalytics.stages) reruns that stage and the
+        ones after it, with the stages before it loaded from their checkpoints.
+        '''
+        self.precision = precision
+        self.gapPolicy = gapPolicy
+        # Steps 2 and 3 run on a pool of this many processes, partitioned by user (None for all cores)
+        self.workers = workers
+        # Sub trajectories are whole segments unless a window size (pairs) or duration (seconds) is given
+        self.windowSize = windowSize
+        self.windowDuration = windowDuration
+        self.windowStride = windowStride
+        # Point features of FeatureRegistry that are computed, the four default ones always come first
+        self.pointFeatures = FeatureRegistry.withDefaults(extraPointFeatures)
+        # Segments dropped in step 3 anyway are dropped before their point features are computed. Windows
+        # are cut from segments of any length, so with windows only the excluded modes are dropped early.
+        self.minPoints = None if (windowSize or windowDuration) else Featurization.minPoints
+        self.checkpoints = Checkpoints(cacheDir, fileName, [
+            # With a chunkSize the file is read by Ingestion instead of Preprocessing
+            ('preProcessing', {'chunkSize': chunkSize}),
+            ('pointFeatures', {'precision': precision, 'gapPolicy': gapPolicy, 'pointFeatures': self.pointFeatures,
+                               'excludedModes': Utils.excludedModes, 'minPoints': self.minPoints}),
+            ('subTrajectories', {'windowSize': windowSize, 'windowDuration': windowDuration,
+                                 'windowStride': windowStride}),
+            ('similarities', {}),
+            ('classify', {}),
+            ('evaluate', {})], fromStage)
+
+        self.pointTable, loaded = self.checkpoints.run('preProcessing', lambda: self.preProcessing(fileName, chunkSize))
+        print("Step 1 loaded from checkpoint" if loaded else "Step 1 successful")
+        # Checkpointed columns are memory-mapped
+        self.dataAll, loaded = self.checkpoints.run('pointFeatures', self.calculatePointFeatures)
+        if loaded:
+            self.dataA1Soln = self.dataAll
+            self.segments = Segments.fromFlags(self.dataAll['flag'])
+        print("Step 2 loaded from checkpoint" if loaded else "Step 2 successful")
+        self.dataAllMeasures, loaded = self.checkpoints.run('subTrajectories', self.calculateSubTrajectories,
+                                                            Checkpoints.rowsTable, Checkpoints.tableRows)
+        print("Step 3 loaded from checkpoint" if loaded else "Step 3 successful")
+        # This is just for plotting the data
+        loaded = self.checkpoints.runReport('similarities', self.similarTransportationModes)
+        print("Step 4 loaded from checkpoint" if loaded else "Step 4 successful")
+        self.dataSubTrajectories = Utils.subTrajectoryFrame(self.dataAllMeasures, self.precision,
+                                                            FeatureRegistry.subTrajectoryColumns(self.pointFeatures))
         self.dataSubTrajectories = self.dataSubTrajectories.drop(['t_user_id', 'date_Start', 'flag'], axis=1)
-        self.classify()
-        print("Step 5 successful")
-        self.evaluteResults()
-        print("Step 6 successful")
+        loaded = self.checkpoints.runReport('classify', self.classify)
+        print("Step 5 loaded from checkpoint" if loaded else "Step 5 successful")
+        loaded = self.checkpoints.runReport('evaluate', self.evaluteResults)
+        print("Step 6 loaded from checkpoint" if loaded else "Step 6 successful")
 
 
-    def preProcessing(self, fileName):
+    def preProcessing(self, fileName, chunkSize=None):
         '''
         First we read the csv file. Loading the Input Data and sorting it in ascending order
         of 't_user_id' and 'collected_time'. This way of sorting the data is equivalent to
         grouping the data on the bases of 't_user_id' and 'collected_time'.
-        Param :- self
-        Return :- dataList
-        '''
-        df = pd.read_csv(fileName)
-        total = len(df)
-        df = df.sort_values(['t_user_id', 'collected_time'], ascending=True).reset_index(drop=True)
-        x = df['collected_time'].str.split(' ', expand=True)
-        df['date_Start'] = x[0]
-        y = x[1].str.split('-', expand=True)
-        df['time_Start'] = y[0]
-        df['latitude_Start'] = df['latitude']
-        df['longitude_Start'] = df['longitude']
-        df['latitude_End'] = df['latitude'].drop([0]).reset_index(drop=True)
-        df['longitude_End'] = df['longitude'].drop([0]).reset_index(drop=True)
-        df['date_End'] = df['date_Start'].drop([0]).reset_index(drop=True)
-        df['time_End'] = df['time_Start'].drop([0]).reset_index(drop=True)
-        df['UserChk'] = df['t_user_id'].drop([0]).reset_index(drop=True)
-        df['ModeChk'] = df['transportation_mode'].drop([0]).reset_index(drop=True)
-        df = df.drop('collected_time', axis=1)
-        df = df.drop('latitude', axis=1)
-        df = df.drop('longitude', axis=1)
-        df = df.drop([total - 1], axis=0)
-        '''
-        Columns of processable data now are :- 
+        The timestamps are parsed once into epoch seconds and every consecutive pair of points
+        becomes one row of a table of typed column arrays (see Preprocessing.preProcess):-
         't_user_id', 'transportation_mode', 'date_Start', 'time_Start',
         ' latitude_Start', 'longitude_Start', 'latitude_End', 'longitude_End',
-        'date_End', 'time_End', 'UserChk', 'ModeChk' 
-        We finally convert this DataFrame to list of lists because of the better time complexity of lists than pandas DataFrame
+        'date_End', 'time_End', 'UserChk', 'ModeChk'
+        With a chunkSize the file is streamed in chunks instead (see Ingestion.preProcess), which
+        keeps memory flat. An unsorted file is then first sorted on disk with ExternalSort.
+        Param :- self, fileName, chunkSize
+        Return :- pointTable
         '''
-        return df.values.tolist()
+        if chunkSize:
+            sortedName = ExternalSort.ensureSorted(fileName, chunkSize)
+            try:
+                return Ingestion.preProcess(sortedName, chunkSize)
+            finally:
+                if sortedName != fileName:
+                    os.remove(sortedName)
+        return Preprocessing.preProcess(fileName)
 
     def calculatePointFeatures(self):
         '''
-        Here we are calculating distance, speed, acceleration and bearing.
+        Here we are calculating distance, speed, acceleration and bearing, plus the extra point
+        features asked for in self.pointFeatures (see FeatureRegistry).
 
         Filtering the data so as to remove as per our preprocessed data and understanding of trajectories.
         We are filtering:-
         1. The information if starting inf is from 1 user and ending inf is from another user
         2. The information if starting inf is from 1 transportation mode and ending inf is from another transportation mode
         3. If the starting date and ending date match or not
+        Pairs with a zero or negative time gap are handled according to self.gapPolicy
+        (see Preprocessing.gapPolicies). The segments of motorcycle and run and the segments
+        that are too short for step 3 are dropped before the features are computed.
         '''
 
-        FMT = '%H:%M:%S'
-        filteredData = [item for item in self.dataList
-                        if item[0] == item[10] and item[1] == item[11] and item[2] == item[8]]
-
-        # Here we are creating a flag numerical column so as to easily find when there is a change in subtrajectory or trajectory
-        startId = filteredData[0][0]
-        startMode = filteredData[0][1]
-        startDate = filteredData[0][2]
-        subTrajGrper = []
-        count = 1
-        for row in filteredData:
-            if (startId == row[0] and startMode == row[1] and startDate == row[2]):
-                subTrajGrper.append(count)
-            else:
-                startId = row[0]
-                startMode = row[1]
-                startDate = row[2]
-                count += 1
-                subTrajGrper.append(count)
-        # Calculating Distance
-        distance = [haversine((float(row[4]), float(row[5])), (float(row[6]), float(row[7]))) * 1000.0 for row in
-                    filteredData]
-        # Calculating Time
-        time = [(datetime.strptime(str(row[9]), FMT) - datetime.strptime(str(row[3]), FMT)).seconds for row in
-                filteredData]
-        # Calculating speed
-        speed = [x / y if y != 0 else 0 for x, y in zip(distance, time)]
-        # Calculating acceleration
-        pairedSpeed = list(Utils.pairwise(speed))
-        acceleration = [(x[1] - x[0]) / y if (y != 0 and x[1] != None) else 0 for x, y in zip(pairedSpeed, time)]
-        # Calculating Bearing
-        bearing = [Utils.bearing_Calculator(row) for row in filteredData]
-
-        # Here we are doing a list compression so as to add the answer of Q1 to our preprocessed data.
-        dataA1Soln = [u + [v, w, x, y, z] for u, v, w, x, y, z in
-                      zip(filteredData, subTrajGrper, distance, speed, acceleration, bearing)]
-
-        # Here we are masking the accleration to 0 in case it is calculated by change in speed between 2 different users.
-        pairedA1 = list(Utils.pairwise(dataA1Soln))
-        self.dataA1Soln = [list(map(mul, rows[0], [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 1])) if (
-                    rows[1] != None and rows[0][12] != rows[1][12]) else rows[0] for rows in pairedA1]
-        return dataA1Soln
+        if self.workers == 1:
+            self.dataA1Soln, self.segments = Featurization.pointFeatures(self.pointTable, self.pointFeatures,
+                                                                         self.precision, self.gapPolicy,
+                                                                         Utils.excludedModes, self.minPoints)
+        else:
+            self.dataA1Soln, self.segments = Parallel.pointFeatures(self.pointTable, self.pointFeatures,
+                                                                    self.precision, self.gapPolicy,
+                                                                    Utils.excludedModes, self.minPoints, self.workers)
+        return self.dataA1Soln
 
     def calculateSubTrajectories(self):
-        ##### Creating sub trajectories #####
-
-        # We are filtering the data to contain only the useful columns for calculating A2 and A3
-        list1 = [0, 1, 2, 12, 13, 14, 15, 16]
-        dataImp = [[each_list[i] for i in list1] for each_list in self.dataA1Soln]
-
-        # Grouping the data for A2
-        dataSubTrajectory = [list(items) for _, items in groupby(dataImp, itemgetter(0, 1, 2, 3))]
-
-        # Filtering the subtrajectories which have points less than 10
-        dataFiltSubTrj = [grp for grp in dataSubTrajectory if (len(grp) > 10)]
-
-        # Calculating all the statistical values for A2. Here we calculate the
-        # minimum, maximum, mean and median for every subtrajectory.
-        A2Traj = []
-        count = 0
-        for grp in dataFiltSubTrj:
-            count += 1
-            statsDistance = Utils.stats_Calculator([distanceRow[4] for distanceRow in grp])
-            statsSpeed = Utils.stats_Calculator([speedRow[5] for speedRow in grp])
-            statsAcceleration = Utils.stats_Calculator([accRow[6] for accRow in grp])
-            statsBearing = Utils.stats_Calculator([bearRow[7] for bearRow in grp])
-
-            x1 = [grp[0][0], grp[0][1], grp[0][2], grp[0][3]]
-            A2Traj.append(x1 + statsDistance + statsSpeed + statsAcceleration + statsBearing)
-
-        # Filtering the subrajectories of motorcycle and run
-        A2FiltTraj = [trj for trj in A2Traj if (trj[1] != 'motorcycle' and trj[1] != 'run')]
-
-        return A2FiltTraj
+        '''
+        Creating the sub trajectories from the segments found in calculatePointFeatures. Every
+        sub trajectory with more than 10 points gets the minimum, maximum, mean, median and
+        standard deviation of each point feature, and the ones of motorcycle and run are dropped
+        (see Featurization.subTrajectories).
+        With a window size or duration every segment is cut into windows advancing by the window
+        stride instead, and every window becomes a sub trajectory (see Windows.subTrajectories).
+        With more than one worker the users are spread over a process pool (see Parallel).
+        '''
+        if self.workers != 1:
+            window = {'size': self.windowSize, 'duration': self.windowDuration, 'stride': self.windowStride} \
+                if (self.windowSize or self.windowDuration) else None
+            return Parallel.subTrajectories(self.dataA1Soln, self.segments, self.pointFeatures,
+                                            window=window, workers=self.workers)
+        if self.windowSize or self.windowDuration:
+            return Windows.subTrajectories(self.dataA1Soln, self.segments, self.pointFeatures,
+                                           self.windowSize, self.windowDuration, self.windowStride)
+        return Featurization.subTrajectories(self.dataA1Soln, self.segments, self.pointFeatures)
 
         # TODO: Fix this stuff
         '''
@@ -193,9 +194,10 @@ class TrajectoryAnalytics:
 
         output = pd.DataFrame(A2FiltTrajF, columns=['t_user_id', 'transportation_mode', 'date_Start', 'Flag'
             , 'meanDis', 'meanSpeed', 'meanAcc', 'meanBrng'])
+        output['transportation_mode'] = Utils.modeNames(output['transportation_mode'])
 
         # Grouping by the mode so as to analyse the silimarities and disimilarities between classes
-        outgrp = output.groupby(['transportation_mode'])
+        outgrp = output.groupby('transportation_mode')
 
         # Computing the mean per class for the 4 feature values i.e distance, speed, acceleration and bearing.
         dicPerType = {}
@@ -412,4 +414,13 @@ class TrajectoryAnalytics:
         print()
 
 if __name__ == '__main__':
-    obj = TrajectoryAnalytics("geolife_raw.csv")
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description='Predicting transportation modes of GPS trajectories')
+    parser.add_argument('fileName', nargs='?', default='geolife_raw.csv')
+    parser.add_argument('--checkpoint-dir', default=None, help='directory of the stage checkpoints')
+    parser.add_argument('--from-stage', default=None, choices=TrajectoryAnalytics.stages,
+                        help='rerun this stage and the ones after it')
+    Instrumentation.addArguments(parser)
+    args = parser.parse_args()
+    Instrumentation.fromArguments(args)
+    obj = TrajectoryAnalytics(args.fileName, cacheDir=args.checkpoint_dir, fromStage=args.from_stage)
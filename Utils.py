@@ -1,6 +1,7 @@
 import math
 import itertools
 import numpy as np
+import pandas as pd
 
 class Utils:
     '''
@@ -11,8 +12,43 @@ class Utils:
         , 'minSpeed', 'maxSpeed', 'meanSpeed', 'medianSpeed', 'stdSpeed'
         , 'minAcc', 'maxAcc', 'meanAcc', 'medianAcc', 'stdAcc'
         , 'minBrng', 'maxBrng', 'meanBrng', 'medianBrng', 'stdBrng']
+    '''
+    Transportation modes of the GeoLife labels. Modes are carried through the pipeline as int8
+    codes, the code of a mode is its index in this list
+    '''
+    modes = ['airplane', 'bike', 'boat', 'bus', 'car', 'motorcycle', 'run', 'subway', 'taxi', 'train', 'walk']
+    # Modes whose sub trajectories are dropped before classification
+    excludedModes = ['motorcycle', 'run']
+    '''
+    Columns of the preprocessed point table, in the same order as the rows of the old list of lists
+    '''
+    pointColumns = ['t_user_id', 'transportation_mode', 'date_Start', 'time_Start'
+        , 'latitude_Start', 'longitude_Start', 'latitude_End', 'longitude_End'
+        , 'date_End', 'time_End', 'UserChk', 'ModeChk']
+
+    def modeCode(mode):
+        return Utils.modes.index(mode)
+
+    def modeNames(codes):
+        return np.asarray(Utils.modes, dtype=object)[np.asarray(codes, dtype=np.intp)]
+
+    # Building the sub trajectory DataFrame with a compact layout: int32 ids, day numbers and
+    # flags, the mode as a categorical (int8 codes underneath, but it still compares equal to
+    # the mode names used as class labels) and the 20 features in the given float type.
+    def subTrajectoryFrame(rows, precision='float64', columns=None):
+        columns = columns or Utils.columns
+        frame = pd.DataFrame(rows, columns=columns)
+        frame['t_user_id'] = frame['t_user_id'].astype(np.int32)
+        frame['date_Start'] = frame['date_Start'].astype(np.int32)
+        frame['flag'] = frame['flag'].astype(np.int32)
+        frame['transportation_mode'] = pd.Categorical.from_codes(frame['transportation_mode'].astype(np.int8),
+                                                                 Utils.modes)
+        features = columns[4:]
+        frame[features] = frame[features].astype(precision)
+        return frame
+
     # This is the method to calculate bearing between two points on the bases
-    # of latitute and longitutes of the 2 points.
+    # of latitute and longitutes of the 2 points. It is kept as the per row reference of bearingArray.
     def bearing_Calculator(row):
         start, end = ((row[4], row[5]), (row[6], row[7]))
         lat1 = math.radians(float(start[0]))
@@ -26,6 +62,84 @@ class Utils:
         compass_bearing = (initial_bearing + 360) % 360
         return compass_bearing
 
+    # Mean earth radius in metres, the same one the haversine package uses
+    earthRadius = 6371008.8
+
+    # Array version of haversine((lat1, lon1), (lat2, lon2)) * 1000.0, the distance in metres
+    # between every pair of points of the four coordinate columns. dtype selects float64 or
+    # float32 arithmetic and the result can be written into a preallocated out buffer.
+    # The coordinate differences are taken before the conversion to radians and to dtype, so with
+    # float64 coordinates (see Preprocessing.precision) float32 does not lose the few metres
+    # between consecutive GPS points to cancellation. Coordinates that are float32 already have
+    # lost them.
+    def haversineArray(lat1, lon1, lat2, lon2, out=None, dtype=np.float64):
+        return Utils.haversineRadians(*Utils.radiansOf(lat1, lon1, lat2, lon2, dtype), out=out, dtype=dtype)
+
+    # Array version of bearing_Calculator, the initial compass bearing in degrees from the
+    # start to the end point of every pair. Same dtype and out options as haversineArray.
+    def bearingArray(lat1, lon1, lat2, lon2, out=None, dtype=np.float64):
+        return Utils.bearingRadians(*Utils.radiansOf(lat1, lon1, lat2, lon2, dtype), out=out, dtype=dtype)
+
+    # haversineArray for a single pair of points with math instead of NumPy, for code that gets
+    # the points one at a time. Same operations in the same order, so it agrees with the array
+    # kernel to the last bits.
+    def haversineScalar(lat1, lon1, lat2, lon2):
+        sinLat = math.sin(math.radians(lat2 - lat1) * 0.5)
+        sinLon = math.sin(math.radians(lon2 - lon1) * 0.5)
+        d = sinLat * sinLat + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * (sinLon * sinLon)
+        return math.asin(math.sqrt(d)) * (2 * Utils.earthRadius)
+
+    # bearingArray for a single pair of points, like haversineScalar
+    def bearingScalar(lat1, lon1, lat2, lon2):
+        dLon = math.radians(lon2 - lon1)
+        cosLat2 = math.cos(math.radians(lat2))
+        sinLon = math.sin(dLon * 0.5)
+        y = sinLon * sinLon * 2 * cosLat2 * math.sin(math.radians(lat1)) + math.sin(math.radians(lat2 - lat1))
+        return (math.degrees(math.atan2(math.sin(dLon) * cosLat2, y)) + 360) % 360
+
+    # The latitudes and the coordinate differences in radians, shared by the two kernels below
+    def radiansOf(lat1, lon1, lat2, lon2, dtype=np.float64):
+        return (np.radians(lat1, dtype=dtype), np.radians(lat2, dtype=dtype),
+                np.radians(np.subtract(lat2, lat1), dtype=dtype), np.radians(np.subtract(lon2, lon1), dtype=dtype))
+
+    # Haversine distance in metres from latitudes and differences in radians. The inputs are
+    # not modified, so they can be shared with other kernels.
+    def haversineRadians(lat1, lat2, dLat, dLon, out=None, dtype=np.float64):
+        # sin^2(dLat / 2) + cos(lat1) * cos(lat2) * sin^2(dLon / 2)
+        d = np.multiply(dLat, 0.5, dtype=dtype)
+        np.sin(d, out=d)
+        d *= d
+        sinLon = np.multiply(dLon, 0.5, dtype=dtype)
+        np.sin(sinLon, out=sinLon)
+        sinLon *= sinLon
+        cosLat = np.cos(lat1, dtype=dtype)
+        cosLat *= np.cos(lat2, dtype=dtype)
+        cosLat *= sinLon
+        d += cosLat
+        np.sqrt(d, out=d)
+        np.arcsin(d, out=d)
+        return np.multiply(d, 2 * Utils.earthRadius, out=out, dtype=dtype)
+
+    # Initial compass bearing in degrees from latitudes and differences in radians.
+    # cos(lat1) * sin(lat2) - sin(lat1) * cos(lat2) * cos(dLon) is evaluated as
+    # sin(dLat) + sin(lat1) * cos(lat2) * 2 * sin^2(dLon / 2), which is the same value
+    # without the cancellation between the two products.
+    def bearingRadians(lat1, lat2, dLat, dLon, out=None, dtype=np.float64):
+        cosLat2 = np.cos(lat2, dtype=dtype)
+        x = np.sin(dLon, dtype=dtype)
+        x *= cosLat2
+        y = np.multiply(dLon, 0.5, dtype=dtype)
+        np.sin(y, out=y)
+        y *= y
+        y *= 2
+        y *= cosLat2
+        y *= np.sin(lat1, dtype=dtype)
+        y += np.sin(dLat, dtype=dtype)
+        bearing = np.arctan2(x, y, out=out, dtype=dtype)
+        np.degrees(bearing, out=bearing)
+        bearing += 360
+        return np.mod(bearing, 360, out=bearing)
+
     # This below method will create this kind of list of list structure
     #         s -> (s0,s1), (s1,s2), (s2, s3), ...
     def pairwise(iterable):
@@ -0,0 +1,150 @@
+from bisect import bisect_left, insort
+from collections import deque
+import numpy as np
+from Utils import *
+from Featurization import *
+from Instrumentation import *
+
+
+class Windows:
+    '''
+    Windowed sub trajectories. Instead of one row per whole (user, mode, date) segment, every
+    segment is cut into windows of a fixed number of pairs or a fixed duration in seconds that
+    advance by a stride, and every window gets a row with the usual statistics. Windows never
+    cross a segment boundary.
+    The windows of the whole table are described by offsets like the segments, the window w
+    covers the rows lo[w]:hi[w], and both lo and hi only grow. The statistics are then computed
+    in one pass over the rows: sums and sums of squares from cumulative sums, minimum and
+    maximum with monotone deques, and the median from a sorted copy of the current window that
+    is updated with bisect as rows enter and leave it.
+    '''
+
+    # Windows of size pairs every stride pairs, segments shorter than size get none
+    def byPoints(starts, ends, size, stride):
+        counts = ends - starts
+        perSegment = np.where(counts >= size, (counts - size) // stride + 1, 0)
+        segment = np.repeat(np.arange(len(starts)), perSegment)
+        first = np.cumsum(perSegment) - perSegment
+        step = np.arange(perSegment.sum()) - np.repeat(first, perSegment)
+        lo = starts[segment] + step * stride
+        return segment, lo, lo + size
+
+    # Windows [t, t + duration) with t = first time of the segment + k * stride seconds, over the
+    # pair start times. Windows with minPoints pairs or less are dropped.
+    def byTime(times, starts, ends, duration, stride, minPoints):
+        counts = ends - starts
+        segment = np.repeat(np.arange(len(starts)), counts)
+        relative = times - np.repeat(times[starts], counts)
+        # One increasing key over all the segments, so every window is found with a single searchsorted
+        spacing = (int(relative.max()) if len(relative) else 0) + duration + stride + 1
+        key = segment * spacing + relative
+        perSegment = relative[ends - 1] // stride + 1 if len(starts) else np.zeros(0, dtype=np.int64)
+        windowSegment = np.repeat(np.arange(len(starts)), perSegment)
+        first = np.cumsum(perSegment) - perSegment
+        windowStart = windowSegment * spacing + (np.arange(perSegment.sum()) - np.repeat(first, perSegment)) * stride
+        lo = np.searchsorted(key, windowStart, side='left')
+        hi = np.searchsorted(key, windowStart + duration, side='left')
+        keep = (hi - lo) > minPoints
+        return windowSegment[keep], lo[keep], hi[keep]
+
+    # Minimum of values[lo[w]:hi[w]] for every window, with a deque of the indices whose values
+    # increase from front to back
+    def slidingMinimum(values, lo, hi):
+        values = values.tolist()
+        result = np.empty(len(lo))
+        window = deque()
+        end = 0
+        for w, (first, last) in enumerate(zip(lo.tolist(), hi.tolist())):
+            end = max(end, first)
+            while end < last:
+                value = values[end]
+                while window and values[window[-1]] >= value:
+                    window.pop()
+                window.append(end)
+                end += 1
+            while window[0] < first:
+                window.popleft()
+            result[w] = values[window[0]]
+        return result
+
+    # Median of values[lo[w]:hi[w]] for every window, like np.median
+    def slidingMedian(values, lo, hi):
+        values = values.tolist()
+        result = np.empty(len(lo))
+        window = []
+        begin = end = 0
+        for w, (first, last) in enumerate(zip(lo.tolist(), hi.tolist())):
+            if first >= end:
+                window = []
+                begin = end = first
+            while begin < first:
+                del window[bisect_left(window, values[begin])]
+                begin += 1
+            while end < last:
+                insort(window, values[end])
+                end += 1
+            n = len(window)
+            result[w] = (window[(n - 1) // 2] + window[n // 2]) / 2
+        return result
+
+    def compute(values, segment, lo, hi, starts, ends):
+        '''
+        Statistics of every feature column over every window, in the layout of SegmentStats.compute.
+        Param :- values (n, k), segment of every window, lo, hi, starts, ends of the segments
+        Return :- (windows, 5 * k) matrix
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        counts = (hi - lo)[:, None]
+        result = np.empty((len(lo), 5, values.shape[1]))
+        # Sums of the values minus the mean of their segment, accumulated in extended precision,
+        # which keeps the differences of the cumulative sums of squares accurate
+        segmentMeans = np.add.reduceat(values, starts, axis=0) / (ends - starts)[:, None] if len(starts) else values[:0]
+        centered = values - np.repeat(segmentMeans, ends - starts, axis=0)
+        zero = np.zeros((1, values.shape[1]), dtype=np.longdouble)
+        sums = np.concatenate((zero, np.cumsum(centered, axis=0, dtype=np.longdouble)))
+        squares = np.concatenate((zero, np.cumsum(centered * centered, axis=0, dtype=np.longdouble)))
+        mean = (sums[hi] - sums[lo]) / counts
+        result[:, 2] = mean + segmentMeans[segment]
+        result[:, 4] = np.sqrt(np.maximum((squares[hi] - squares[lo]) / counts - mean * mean, 0))
+        for column in range(values.shape[1]):
+            result[:, 0, column] = Windows.slidingMinimum(values[:, column], lo, hi)
+            result[:, 1, column] = -Windows.slidingMinimum(-values[:, column], lo, hi)
+            result[:, 3, column] = Windows.slidingMedian(values[:, column], lo, hi)
+        return result.transpose(0, 2, 1).reshape(len(lo), 5 * values.shape[1])
+
+    def subTrajectoryArrays(points, segments, features, size=None, duration=None, stride=None, minPoints=None):
+        '''
+        Windowed version of Featurization.subTrajectoryArrays. Exactly one of size (pairs) or
+        duration (seconds) is given, stride defaults to the same value (windows side by side).
+        Every row keeps the key columns and the 'flag' of the segment the window belongs to.
+        Param :- points, segments, features, size, duration, stride, minPoints (time windows only)
+        Return :- (dict of the 4 key columns, matrix with 5 statistics per feature), one row per window
+        '''
+        if (size is None) == (duration is None):
+            raise ValueError('Either a window size or a window duration is needed')
+        if (size or duration) <= 0 or (stride is not None and stride <= 0):
+            raise ValueError('Window size, duration and stride have to be positive')
+        starts, ends = segments
+        if size is not None:
+            segment, lo, hi = Windows.byPoints(starts, ends, size, stride or size)
+        else:
+            times = points['date_Start'].astype(np.int64) * 86400 + points['time_Start']
+            segment, lo, hi = Windows.byTime(times, starts, ends, duration, stride or duration,
+                                             Featurization.minPoints if minPoints is None else minPoints)
+
+        excluded = [Utils.modeCode(mode) for mode in Utils.excludedModes]
+        keep = ~np.isin(points['transportation_mode'][starts[segment]], excluded)
+        segment, lo, hi = segment[keep], lo[keep], hi[keep]
+
+        with Instrumentation.stage('windowStats', len(points['flag'])) as span:
+            values = np.column_stack([points[name] for name in features])
+            stats = Windows.compute(values, segment, lo, hi, starts, ends)
+            span['rowsOut'] = len(stats)
+        return {name: points[name][starts[segment]] for name in Featurization.keyColumns}, stats
+
+    # The rows of subTrajectoryArrays
+    def subTrajectories(points, segments, features, size=None, duration=None, stride=None, minPoints=None):
+        return Featurization.toRows(*Windows.subTrajectoryArrays(points, segments, features, size, duration,
+                                                                 stride, minPoints))